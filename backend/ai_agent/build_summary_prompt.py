@@ -1,6 +1,7 @@
 from typing import Any
 import pandas as pd
 import matplotlib.pyplot as plt
+from ai_agent.result_digest import digest_result
 
 def create_reasoning_prompt(user_question: str, result_output: Any, table_preview: Any = None) -> str:
     """
@@ -30,12 +31,11 @@ def create_reasoning_prompt(user_question: str, result_output: Any, table_previe
 
         # Include table preview if available
         if table_preview is not None and isinstance(table_preview, pd.DataFrame):
-            preview = table_preview.head(10).to_string(index=False)
-            description += f"\nChart data preview:\n{preview}"
+            description += f"\nChart data:\n{digest_result(table_preview)}"
 
     else:
-        # Just convert the result to a string, limit to 500 chars
-        description = str(result_output)[:500]
+        # Fixed-size digest instead of the printed result
+        description = digest_result(result_output)
 
     # Final prompt depending on chart or non-chart result
     if is_chart:
@@ -50,7 +50,8 @@ Summarize the insights shown in this chart in 3-5 sentences. Focus on patterns,
         return f'''
 User question: "{user_question}"
 
-The following result was returned from the analysis: {description}
+The following result was returned from the analysis:
+{description}
 
 Explain in 3-5 sentences what this tells us about the data. Focus on what stands out, changes over time, or comparisons between values.
 '''.strip()
@@ -0,0 +1,165 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+# ------------------ Chart Store Setup ------------------
+# Charts are rendered once to PNG bytes and named by a hash of their content, so an
+# identical chart is stored once. Recently used PNGs are kept in memory for serving;
+# the directory is bounded by total size and file age, enforced by a background sweep.
+CHART_DIR = os.getenv("CHART_DIR", "charts")
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+CHART_MEMORY_MB = float(os.getenv("CHART_MEMORY_MB", "32"))
+CHART_STORE_MAX_MB = float(os.getenv("CHART_STORE_MAX_MB", "200"))
+CHART_STORE_MAX_AGE = float(os.getenv("CHART_STORE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+CHART_EVICT_INTERVAL = float(os.getenv("CHART_EVICT_INTERVAL", "300"))  # seconds
+
+def render_chart(chart_object) -> bytes:
+    """
+    Encodes a Figure (or the Figure of an Axes) as PNG bytes and closes it.
+    """
+    fig = chart_object.figure if isinstance(chart_object, plt.Axes) else chart_object
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format="png", dpi=CHART_DPI)
+    finally:
+        # Drop it from pyplot's registry so the figure can be garbage-collected
+        plt.close(fig)
+    return buffer.getvalue()
+
+class ChartStore:
+    def __init__(self, directory=CHART_DIR, memory_mb=CHART_MEMORY_MB,
+                 max_mb=CHART_STORE_MAX_MB, max_age=CHART_STORE_MAX_AGE, interval=CHART_EVICT_INTERVAL):
+        self.directory = directory
+        self.memory_bytes = int(memory_mb * 1024 * 1024)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age
+        self.interval = interval
+        self._cache = OrderedDict()  # filename -> PNG bytes
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"saved": 0, "deduplicated": 0, "memory_hits": 0, "disk_reads": 0, "evicted": 0}
+
+    def _remember(self, name, data):
+        # Caller holds the lock
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return
+        self._cache[name] = data
+        self._cached_bytes += len(data)
+        while self._cached_bytes > self.memory_bytes and len(self._cache) > 1:
+            _, dropped = self._cache.popitem(last=False)
+            self._cached_bytes -= len(dropped)
+
+    def save(self, chart_object) -> str:
+        """
+        Renders the chart and stores it under its content hash. Returns the filename.
+        """
+        data = render_chart(chart_object)
+        name = hashlib.sha256(data).hexdigest()[:16] + ".png"
+        path = os.path.join(self.directory, name)
+
+        with self._lock:
+            self._remember(name, data)
+        if os.path.exists(path):
+            self.stats["deduplicated"] += 1
+            try:
+                os.utime(path)  # keeps a reused chart from aging out
+            except OSError:
+                pass
+            return name
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.stats["saved"] += 1
+        return name
+
+    def get(self, name):
+        """
+        Returns the PNG bytes for a filename from memory or disk, or None if unknown/evicted.
+        """
+        with self._lock:
+            data = self._cache.get(name)
+            if data is not None:
+                self._cache.move_to_end(name)
+                self.stats["memory_hits"] += 1
+                return data
+
+        if os.path.basename(name) != name or not name.endswith(".png"):
+            return None
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.stats["disk_reads"] += 1
+        with self._lock:
+            self._remember(name, data)
+        return data
+
+    def evict(self) -> int:
+        """
+        Deletes charts older than max_age, then the oldest ones until the directory fits
+        in max_mb. Returns the number of files removed.
+        """
+        try:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.name))
+        except FileNotFoundError:
+            return 0
+
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, name in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            with self._lock:
+                data = self._cache.pop(name, None)
+                if data is not None:
+                    self._cached_bytes -= len(data)
+
+        self.stats["evicted"] += removed
+        return removed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                removed = self.evict()
+                if removed:
+                    print(f"🧹 Removed {removed} old charts")
+            except Exception as e:
+                print(f"[⚠️] Chart eviction failed: {e}")
+
+    def start(self):
+        self.evict()
+        self._thread = threading.Thread(target=self._run, name="chart-eviction", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+chart_store = ChartStore()
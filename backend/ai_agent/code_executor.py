@@ -1,35 +1,454 @@
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # charts are only ever rendered to PNG
 import matplotlib.pyplot as plt
+import hashlib
 import io
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+from ai_agent.tracing import TRACING_ENABLED, TRACE_MEMORY, stage, record_execution
+from sql_store import SQL_BACKEND, SQL_MAX_ROWS
+from utils import split_sql_code
 
-def run_generated_code(generated_code: str, data: pd.DataFrame, needs_plot: bool):
+try:
+    import resource
+except ImportError:  # not available on Windows; limits are then not enforced
+    resource = None
+
+# ------------------ Executor Setup ------------------
+# "inprocess" runs snippets in the server process; "pool" runs them in pre-warmed
+# worker processes that hold the shared DataFrame and enforce CPU/memory limits.
+EXECUTOR_MODE = os.getenv("EXECUTOR_MODE", "inprocess").lower()
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", "2"))
+EXECUTOR_TIMEOUT = float(os.getenv("EXECUTOR_TIMEOUT", "30"))  # wall-clock seconds
+EXECUTOR_CPU_SECONDS = int(os.getenv("EXECUTOR_CPU_SECONDS", "20"))
+EXECUTOR_MEMORY_MB = int(os.getenv("EXECUTOR_MEMORY_MB", "0"))  # 0 = unlimited
+EXECUTOR_SHARED_DIR = os.getenv(
+    "EXECUTOR_SHARED_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".snapshot", "shared")
+)
+COMPILED_CACHE_SIZE = 256
+
+# pyplot keeps a global "current figure", so plotting snippets must not run
+# concurrently on the execution pool; analysis-only snippets run in parallel
+_pyplot_lock = threading.Lock()
+
+# ------------------ Compiled Code Cache ------------------
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+compile_stats = {"hits": 0, "misses": 0}
+
+def compile_generated_code(generated_code: str):
     """
-    Executes the AI-generated Python code safely with the given dataset.
-    If a plot is needed, it also provides access to matplotlib.
+    Returns the compiled code object for a snippet, reusing it when the same code runs again.
+    """
+    key = hashlib.sha256(generated_code.encode("utf-8")).hexdigest()
+    with _compiled_lock:
+        code_obj = _compiled.get(key)
+        if code_obj is not None:
+            _compiled.move_to_end(key)
+            compile_stats["hits"] += 1
+            return code_obj
+
+    code_obj = compile(generated_code, f"<generated-{key[:8]}>", "exec")
+    with _compiled_lock:
+        compile_stats["misses"] += 1
+        _compiled[key] = code_obj
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return code_obj
+
+# ------------------ Execution ------------------
+def _rows_referenced(code_obj, execution_env) -> int:
+    # Rows of every DataFrame the snippet names (rows pulled through select_rows are counted as they are returned)
+    names = set(code_obj.co_names)
+    return sum(
+        len(value) for name, value in execution_env.items()
+        if name in names and isinstance(value, pd.DataFrame)
+    )
+
+def _count_selected(select_rows, counter):
+    def counted(*args, **kwargs):
+        rows = select_rows(*args, **kwargs)
+        counter[0] += len(rows)
+        return rows
+    return counted
+
+def _execute(generated_code: str, data: pd.DataFrame, needs_plot: bool, extra_frames: dict = None) -> dict:
+    """
+    Compiles and runs a snippet against `data` (plus any extra named frames, e.g. rollups).
+    Returns a dict with result, table_result, error and timings (in milliseconds).
     """
+    timings = {}
+    outcome = {"result": None, "table_result": None, "error": None, "timings": timings}
 
-    # Setup the environment with necessary libraries and the DataFrame
+    # Setup the environment with necessary libraries and the DataFrame.
+    # The frames are shared by every query running at the same time (and by the rollups,
+    # the time index and the caches), so the snippet gets shallow copies: adding columns,
+    # dropping or reordering rows in place only ever changes its own copy
     execution_env = {
         "pd": pd,
-        "df": data
+        "df": data.copy(deep=False)
     }
+    extra_frames = dict(extra_frames or {})
+    room_index = extra_frames.pop("room_index", None)
+    if room_index is not None:
+        # Offset table of the (room, timestamp)-sorted frame -> select_rows() helper (returns copies)
+        from time_index import make_row_selector
+        execution_env["select_rows"] = make_row_selector(data, room_index)
+    execution_env.update({
+        name: frame.copy(deep=False) if isinstance(frame, pd.DataFrame) else frame
+        for name, frame in extra_frames.items()
+    })
+
+    selected = [0]
+    if TRACING_ENABLED and "select_rows" in execution_env:
+        execution_env["select_rows"] = _count_selected(execution_env["select_rows"], selected)
 
     # If the result includes a plot, add plotting tools
     if needs_plot:
-        plt.rcParams["figure.dpi"] = 100 
+        plt.rcParams["figure.dpi"] = 100
         execution_env["plt"] = plt
         execution_env["io"] = io
 
     try:
+        start = time.perf_counter()
+        code_obj = compile_generated_code(generated_code)
+        timings["compile_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        if TRACING_ENABLED:
+            rows_referenced = _rows_referenced(code_obj, execution_env)
+            if TRACE_MEMORY:
+                # Process-wide: overlapping snippets in the same process share the peak
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+
         # Run the code in the prepared environment
-        exec(generated_code, {}, execution_env)
+        start = time.perf_counter()
+        if needs_plot:
+            with _pyplot_lock:
+                try:
+                    exec(code_obj, {}, execution_env)
+                finally:
+                    # Unregister every figure the snippet opened; the returned Figure
+                    # stays usable for rendering and is freed once it has been saved
+                    plt.close("all")
+        else:
+            exec(code_obj, {}, execution_env)
+        timings["exec_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        if TRACING_ENABLED:
+            timings["rows_scanned"] = rows_referenced + selected[0]
+            if TRACE_MEMORY:
+                timings["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
 
         # Get plot (if any) and table result
-        plot_result = execution_env.get("result", None)
-        table_result = execution_env.get("table_result", None)
+        outcome["result"] = execution_env.get("result", None)
+        outcome["table_result"] = execution_env.get("table_result", None)
+
+    except MemoryError:
+        outcome["error"] = "Error executing code: memory limit exceeded"
+    except Exception as error:
+        outcome["error"] = f"Error executing code: {error}"
+
+    return outcome
 
-        return (plot_result, table_result)
+# ------------------ Worker Process Side ------------------
+_worker_frames = {}  # name -> (path, DataFrame)
 
+class CpuLimitExceeded(Exception):
+    pass
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded(f"CPU time limit of {EXECUTOR_CPU_SECONDS}s exceeded")
+
+def _init_worker(memory_mb):
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _attach_frame(name, path):
+    """
+    Maps a published Arrow file; numeric columns stay backed by the shared page cache.
+    """
+    current = _worker_frames.get(name)
+    if current is None or current[0] != path:
+        import pyarrow as pa
+        source = pa.memory_map(path, "r")
+        table = pa.ipc.open_file(source).read_all()
+        _worker_frames[name] = (path, table.to_pandas(split_blocks=True))
+    return _worker_frames[name][1]
+
+def _worker_execute(generated_code, frame_paths, needs_plot, cpu_seconds):
+    start = time.perf_counter()
+    # Published frames come as file paths, frames sent with the task as DataFrames
+    frames = {
+        name: _attach_frame(name, source) if isinstance(source, str) else source
+        for name, source in frame_paths.items()
+    }
+    data = frames.pop("df")
+    load_ms = round((time.perf_counter() - start) * 1000, 3)
+    if generated_code is None:  # warm-up task
+        return {"timings": {"load_ms": load_ms}}
+
+    if resource is not None and cpu_seconds:
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(used.ru_utime + used.ru_stime) + cpu_seconds
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+    try:
+        outcome = _execute(generated_code, data, needs_plot, frames)
+    except CpuLimitExceeded as e:
+        # Raised outside the snippet itself (e.g. while compiling)
+        outcome = {"result": None, "table_result": None, "error": f"Error executing code: {e}", "timings": {}}
+    finally:
+        if resource is not None and cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+
+    # Figures travel back pickled; drop them from this worker's pyplot registry
+    plt.close("all")
+    outcome["timings"]["load_ms"] = load_ms
+    return outcome
+
+# ------------------ Worker Pool Side ------------------
+_pool = None
+_pool_lock = threading.Lock()
+_published = {}  # name -> (DataFrame, path)
+_in_flight = {}  # pool -> futures submitted to it that have not finished
+_publish_counter = itertools.count()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned (not forked) so workers never inherit the server's threads or held locks
+            _pool = ProcessPoolExecutor(
+                max_workers=EXECUTOR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(EXECUTOR_MEMORY_MB,)
+            )
+        return _pool
+
+def _submit(pool, *args):
+    future = pool.submit(_worker_execute, *args)
+    with _pool_lock:
+        _in_flight.setdefault(pool, set()).add(future)
+    future.add_done_callback(lambda done: _forget(pool, done))
+    return future
+
+def _forget(pool, future):
+    with _pool_lock:
+        futures = _in_flight.get(pool)
+        if futures is not None:
+            futures.discard(future)
+
+def _detach(pool):
+    # Later calls start a fresh pool; returns the futures still running on the old one,
+    # or None if it was already detached
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+        return _in_flight.pop(pool, None)
+
+def _terminate(pool):
+    for process in list(getattr(pool, "_processes", {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _recycle_pool(pool):
+    """
+    Replaces a broken pool (a worker died, so it cannot run anything more); the next call starts fresh workers.
+    """
+    _detach(pool)
+    _terminate(pool)
+
+def _retire_pool(pool, stuck_future):
+    """
+    Takes a pool whose worker is stuck on a timed-out snippet out of service. New snippets
+    go to a fresh pool; the old workers are killed only once the snippets already running
+    on them have finished, so one timeout never fails other queries.
+    """
+    running = _detach(pool)
+    if running is None:  # already being retired
+        return
+    others = [future for future in running if future is not stuck_future]
+
+    def finish():
+        wait(others, timeout=EXECUTOR_TIMEOUT)
+        _terminate(pool)
+    threading.Thread(target=finish, name="executor-retire", daemon=True).start()
+
+def _remove_orphaned_frames():
+    # Files are named frame-<server pid>-<n>.arrow; drop those left by servers that exited
+    for file in os.listdir(EXECUTOR_SHARED_DIR):
+        parts = file.split("-")
+        if len(parts) != 3 or not parts[1].isdigit():
+            continue
+        try:
+            os.kill(int(parts[1]), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(os.path.join(EXECUTOR_SHARED_DIR, file))
+            except OSError:
+                pass
+        except OSError:
+            pass
+
+def _publish_frames(frames: dict) -> dict:
+    """
+    Writes each DataFrame once as an Arrow IPC file that every worker memory-maps,
+    instead of pickling it into each call. Returns name -> path.
+    """
+    return {name: _publish_frame(name, data) for name, data in frames.items()}
+
+def _publish_frame(name: str, data: pd.DataFrame) -> str:
+    # Republished only when a different frame object is passed for this name
+    with _pool_lock:
+        previous = _published.get(name)
+        if previous is not None and previous[0] is data:
+            return previous[1]
+
+        import pyarrow as pa
+        if not _published:
+            os.makedirs(EXECUTOR_SHARED_DIR, exist_ok=True)
+            _remove_orphaned_frames()
+        path = os.path.join(EXECUTOR_SHARED_DIR, f"frame-{os.getpid()}-{next(_publish_counter)}.arrow")
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        # Workers that already mapped the old file keep their mapping
+        if previous is not None:
+            try:
+                os.remove(previous[1])
+            except OSError:
+                pass
+        _published[name] = (data, path)
+        return path
+
+def warm_up_pool(data: pd.DataFrame, extra_frames: dict = None):
+    """
+    Starts the worker processes and has each one map the current frames ahead of the first query.
+    """
+    if EXECUTOR_MODE != "pool":
+        return
+    paths = _publish_frames({"df": data, **(extra_frames or {})})
+    pool = _get_pool()
+    for _ in range(EXECUTOR_WORKERS):
+        _submit(pool, None, paths, False, 0)
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _execute_in_pool(generated_code: str, data: pd.DataFrame, needs_plot: bool, extra_frames: dict = None,
+                     share_frames: bool = True) -> dict:
+    start = time.perf_counter()
+    pool = future = None
+    try:
+        frames = {"df": data, **(extra_frames or {})}
+        paths = _publish_frames(frames) if share_frames else frames
+        pool = _get_pool()
+        future = _submit(pool, generated_code, paths, needs_plot, EXECUTOR_CPU_SECONDS)
+        outcome = future.result(timeout=EXECUTOR_TIMEOUT)
+    except FutureTimeout:
+        # Still queued behind other snippets: nothing to kill. Running: its worker is stuck
+        if not future.cancel():
+            _retire_pool(pool, future)
+        outcome = {
+            "result": None, "table_result": None, "timings": {},
+            "error": f"Error executing code: timed out after {EXECUTOR_TIMEOUT:g}s"
+        }
+    except BrokenProcessPool as error:
+        # A crashed worker (e.g. killed by the OS) breaks the pool; start over next time
+        if pool is not None:
+            _recycle_pool(pool)
+        outcome = {"result": None, "table_result": None, "timings": {}, "error": f"Error executing code: {error}"}
     except Exception as error:
-        # Return the error if code fails
-        return (f"Error executing code: {error}", None)
\ No newline at end of file
+        # The snippet's own failure (e.g. an unpicklable result); the workers are fine
+        outcome = {"result": None, "table_result": None, "timings": {}, "error": f"Error executing code: {error}"}
+    outcome["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return outcome
+
+def execute_generated_code(generated_code: str, data: pd.DataFrame, needs_plot: bool, extra_frames: dict = None,
+                           share_frames: bool = True) -> dict:
+    """
+    Runs the AI-generated code with the given dataset and returns a structured result:
+    result, table_result, error (None on success) and timings in milliseconds.
+    extra_frames are exposed to the code under their names (e.g. df_hourly, df_daily);
+    a "room_index" frame is turned into the select_rows() helper instead.
+    share_frames=False sends the frames with the task instead of publishing them for
+    every worker to map, for one-off frames such as a single query's result.
+    """
+    if EXECUTOR_MODE == "pool":
+        return _execute_in_pool(generated_code, data, needs_plot, extra_frames, share_frames)
+
+    start = time.perf_counter()
+    outcome = _execute(generated_code, data, needs_plot, extra_frames)
+    outcome["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return outcome
+
+# ------------------ SQL Execution ------------------
+def execute_generated_sql(generated_code: str, archive, needs_plot: bool) -> dict:
+    """
+    Runs a generated SQL query on the Parquet archive (SQL mode). The result DataFrame is
+    the table; for charts, the generated plotting code then runs with it as `df`, through
+    the same executor (and limits) as Python-mode snippets.
+    Returns the same dict as execute_generated_code.
+    """
+    start = time.perf_counter()
+    timings = {}
+    outcome = {"result": None, "table_result": None, "error": None, "timings": timings}
+    sql, plot_code = split_sql_code(generated_code)
+    try:
+        data, truncated = archive.query(sql, timeout=EXECUTOR_TIMEOUT)
+        timings["query_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        if truncated:
+            print(f"[⚠️] SQL result cut to the first {SQL_MAX_ROWS} rows")
+        outcome["result"] = outcome["table_result"] = data
+
+        if needs_plot and plot_code:
+            plotted = execute_generated_code(plot_code, data, True, share_frames=False)
+            timings.update(plotted["timings"])
+            outcome["result"] = plotted["result"]
+            outcome["error"] = plotted["error"]
+    except MemoryError:
+        outcome["error"] = "Error executing code: memory limit exceeded"
+    except Exception as error:
+        outcome["error"] = f"Error executing code: {error}"
+
+    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return outcome
+
+def run_generated_code(generated_code: str, data: pd.DataFrame, needs_plot: bool, extra_frames: dict = None):
+    """
+    Executes the AI-generated Python code safely with the given dataset.
+    If a plot is needed, it also provides access to matplotlib.
+    In SQL mode `data` is the Parquet archive and the code is a SQL query.
+    """
+    with stage("execute"):
+        if SQL_BACKEND:
+            outcome = execute_generated_sql(generated_code, data, needs_plot)
+        else:
+            outcome = execute_generated_code(generated_code, data, needs_plot, extra_frames)
+    record_execution(outcome["timings"])
+
+    # Return the error if code fails
+    if outcome["error"] is not None:
+        return (outcome["error"], None)
+    return (outcome["result"], outcome["table_result"])
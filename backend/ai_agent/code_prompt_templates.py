@@ -1,26 +1,31 @@
 import pandas as pd
 
-# ------------------ plot_prompt_generator ---------------------------
-def plot_prompt_generator(data: pd.DataFrame, user_question: str) -> str:
+# ------------------ Stable Prompt Layout ---------------------------
+# Everything that only depends on the dataset (schema, profile, rules) comes first and
+# the question comes last, so consecutive prompts share a long identical prefix that
+# providers with prompt caching can reuse.
+def schema_block(data: pd.DataFrame) -> str:
     """
-    Creates a prompt to ask the LLM to write Python code using pandas and matplotlib 
-    to generate a plot based on the given question.
+    Plain column list and preview, used when no precomputed profile is given.
     """
     column_names = list(data.columns)
     sample_rows = data.head(10).to_string(index=False)
-
-    return f"""
-You are given a pandas DataFrame named `df`.
-
-Schema:
+    return f"""Schema:
 Columns: {', '.join(column_names)}
 
 Preview:
 {sample_rows}
+"""
 
-Write Python code using pandas and matplotlib (as plt) to answer:
-"{user_question}"
+# ------------------ plot_prompt_generator ---------------------------
+def plot_prompt_prefix(schema_text: str, extra_context: str = "") -> str:
+    """
+    The question-independent part of the plotting prompt.
+    """
+    return f"""
+You are given a pandas DataFrame named `df`.
 
+{schema_text}{extra_context}
 Rules
 -----
 - Use pandas for data manipulation and matplotlib.pyplot (as plt) for plotting.
@@ -28,6 +33,7 @@ Rules
 - Assume the 'timestamp' column is already in datetime format with clean values.
 - When analyzing time-based trends (e.g., by hour or weekday), extract components like df['timestamp'].dt.hour or df['timestamp'].dt.day_name().
 - When filtering, always use `.copy()` to avoid chained assignment warnings.
+- Never change values of `df` in place (e.g. `df.loc[...] = ...`); derive new frames or columns instead.
 - When filtering by date, use comparisons like df['timestamp'] >= pd.Timestamp('2025-07-10') to avoid type errors.
 - When using reset_index(), use named group keys (not anonymous functions), or extract and rename columns explicitly after.
 - Assign the final result (DataFrame, Series, scalar *or* matplotlib Figure) to a variable named `result`.
@@ -46,36 +52,96 @@ Plotting Guidelines
 - Avoid raw timestamps on the x-axis; extract readable components like hour, weekday, or date.
 """
 
-# ------------------ analysis_prompt_generator -------------------------
-def analysis_prompt_generator(data: pd.DataFrame, user_question: str) -> str:
+def plot_prompt_generator(data: pd.DataFrame, user_question: str, extra_context: str = "", schema_text: str = None) -> str:
     """
-    Creates a prompt to ask the LLM to write Python code using only pandas 
-    (no plots) to analyze the data based on the given question.
+    Creates a prompt to ask the LLM to write Python code using pandas and matplotlib 
+    to generate a plot based on the given question.
     """
-    column_names = list(data.columns)
-    sample_rows = data.head(10).to_string(index=False)
+    if schema_text is None:
+        schema_text = schema_block(data)
+    return plot_prompt_prefix(schema_text, extra_context) + question_block(user_question, True)
 
+# ------------------ analysis_prompt_generator -------------------------
+def analysis_prompt_prefix(schema_text: str, extra_context: str = "") -> str:
+    """
+    The question-independent part of the analysis prompt.
+    """
     return f"""
 You are given a pandas DataFrame named `df`.
 
-Schema:
-Columns: {', '.join(column_names)}
-
-Preview:
-{sample_rows}
-
-Write Python code using pandas only (no plotting) to answer:
-"{user_question}"
-
+{schema_text}{extra_context}
 Rules
 -----
-- Use pandas operations on `df` only.
+- Use pandas operations on `df` (and the pre-aggregated DataFrames, if listed above) only.
 - DO NOT use .resample(). Instead, extract the date and use groupby for aggregation.
 - Assume `df['timestamp']` is already a clean pandas datetime column.
 - When analyzing by date, hour, or day of week, use: df['timestamp'].dt.date, .dt.hour, or .dt.day_name() as needed.
 - When filtering a specific date, compute next_day = target_day + pd.Timedelta(days=1) and filter between [target_day, next_day).
 - When filtering, always use `.copy()` to avoid chained assignment warnings.
+- Never change values of `df` in place (e.g. `df.loc[...] = ...`); derive new frames or columns instead.
 - When using reset_index(), use named group keys (not anonymous functions), or extract and rename columns explicitly after.
 - Assign the final result to result.
 - Always return the code inside a single fenced code block that starts with ```python and ends with ```. Never include prose or explanation outside this code block.
 """
+
+def analysis_prompt_generator(data: pd.DataFrame, user_question: str, extra_context: str = "", schema_text: str = None) -> str:
+    """
+    Creates a prompt to ask the LLM to write Python code using only pandas 
+    (no plots) to analyze the data based on the given question.
+    """
+    if schema_text is None:
+        schema_text = schema_block(data)
+    return analysis_prompt_prefix(schema_text, extra_context) + question_block(user_question, False)
+
+# ------------------ sql_prompt_generator -------------------------
+SQL_RULES = """
+Rules
+-----
+- Write ONE DuckDB SQL SELECT statement (CTEs with WITH are fine) over the table `readings`.
+- `room` and `date` are partition keys: filter on them whenever the question names rooms or days, so only the matching files are read.
+- Filter time ranges on `timestamp` with literals like timestamp >= TIMESTAMP '2025-07-10' (rows are stored sorted by time, so such filters skip data too).
+- For time buckets use date_trunc('hour', timestamp), hour(timestamp), dayname(timestamp) or the `date` column.
+- Aggregate in SQL and return only what answers the question; add LIMIT when listing raw readings.
+- Give computed columns readable aliases and ORDER BY the grouping columns.
+- Return the query inside a single fenced code block that starts with ```sql and ends with ```.
+"""
+
+def sql_analysis_prompt_prefix(schema_text: str, extra_context: str = "") -> str:
+    """
+    The question-independent part of the SQL prompt.
+    """
+    return f"""
+You are given a DuckDB table named `readings`.
+
+{schema_text}{extra_context}{SQL_RULES}"""
+
+def sql_plot_prompt_prefix(schema_text: str, extra_context: str = "") -> str:
+    """
+    The question-independent part of the SQL prompt for charts: a query for the data,
+    then matplotlib code that plots its result.
+    """
+    return sql_analysis_prompt_prefix(schema_text, extra_context) + """- Then, in a second fenced block starting with ```python, plot the query result, which is available as a pandas DataFrame named `df`.
+- Use matplotlib.pyplot (as plt): create only ONE plot with `figsize=(10, 6)`, a descriptive title and labelled axes, and assign the Figure to `result`.
+- Use df.pivot(...) to draw one line per room; use marker='o' in line plots; do NOT call plt.show().
+"""
+
+def sql_question_block(user_question: str, needs_plot: bool) -> str:
+    """
+    The per-question tail of the SQL prompt.
+    """
+    tools = "a DuckDB SQL query and matplotlib (as plt) code" if needs_plot else "a DuckDB SQL query"
+    return f"""
+Write {tools} to answer:
+"{user_question}"
+"""
+
+# ------------------ question_block -------------------------
+def question_block(user_question: str, needs_plot: bool) -> str:
+    """
+    The per-question tail appended to a cached prefix.
+    """
+    tools = "pandas and matplotlib (as plt)" if needs_plot else "pandas only (no plotting)"
+    return f"""
+Write Python code using {tools} to answer:
+"{user_question}"
+"""
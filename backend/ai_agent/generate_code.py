@@ -1,44 +1,100 @@
+import time
 import pandas as pd
-from ai_agent.query_understanding import is_visual_query
-from ai_agent.code_prompt_templates import plot_prompt_generator, analysis_prompt_generator
-from ai_agent.llm_client import client, GROQ_MODEL
-from utils import get_first_python_code_block
+from ai_agent.query_understanding import is_visual_query, is_visual_query_async
+from ai_agent.code_prompt_templates import question_block, sql_question_block
+from ai_agent.prompt_context import code_prompt_prefix
+from ai_agent.llm_client import client, async_client, GROQ_MODEL
+from ai_agent.tracing import stage, record_llm_call
+from ai_agent.worker_pool import run_blocking
+from sql_store import SQL_BACKEND
+from utils import get_first_python_code_block, get_first_code_block, join_sql_code
 
-def generate_code_from_query(user_question: str, data_frame: pd.DataFrame):
-    """Generate Python code using LLM based on user's question and dataset."""
+PYTHON_SYSTEM_PROMPT = (
+    "detailed thinking off. You are a Python data-analysis expert who writes clean, efficient code. "
+    "Solve the given problem with optimal pandas operations. Be concise and focused. "
+    "Your response must contain ONLY a properly-closed ```python code block with no explanations before or after. "
+    "Ensure your solution is correct, handles edge cases, and follows best practices for data analysis."
+)
 
-    # Decide whether the question is asking for a plot or just analysis
-    needs_plot = is_visual_query(user_question)
+SQL_SYSTEM_PROMPT = (
+    "detailed thinking off. You are a data-analysis expert who writes clean, efficient DuckDB SQL. "
+    "Solve the given problem with a single query that reads as little data as possible. Be concise and focused. "
+    "Your response must contain ONLY the requested properly-closed code blocks with no explanations before or after. "
+    "Ensure your solution is correct, handles edge cases, and follows best practices for data analysis."
+)
 
-    # Create the prompt depending on whether a plot is needed
-    if needs_plot:
-        prompt_text = plot_prompt_generator(data_frame, user_question)
-    else:
-        prompt_text = analysis_prompt_generator(data_frame, user_question)
+def build_code_messages(user_question: str, data_frame: pd.DataFrame, needs_plot: bool, extra_context: str = "", version: int = None) -> list:
+    """Builds the chat messages asking the LLM for analysis or plotting code."""
+
+    # Create the prompt depending on whether a plot is needed; the dataset part is
+    # reused per dataset version and the question is appended last
+    # (in SQL mode data_frame is the Parquet archive and the LLM is asked for SQL)
+    ask = sql_question_block if SQL_BACKEND else question_block
+    prompt_text = code_prompt_prefix(data_frame, needs_plot, extra_context, version) + ask(user_question, needs_plot)
 
     # Prepare the message to send to the language model
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "detailed thinking off. You are a Python data-analysis expert who writes clean, efficient code. "
-                "Solve the given problem with optimal pandas operations. Be concise and focused. "
-                "Your response must contain ONLY a properly-closed ```python code block with no explanations before or after. "
-                "Ensure your solution is correct, handles edge cases, and follows best practices for data analysis."
-            ),
-        },
+    return [
+        {"role": "system", "content": SQL_SYSTEM_PROMPT if SQL_BACKEND else PYTHON_SYSTEM_PROMPT},
         {"role": "user", "content": prompt_text}
     ]
 
+def extract_generated_code(full_text: str, needs_plot: bool) -> str:
+    """
+    Pulls the code out of the LLM reply: the Python block, or in SQL mode the
+    query plus (for charts) its plotting block.
+    """
+    if not SQL_BACKEND:
+        return get_first_python_code_block(full_text)
+    plot_code = get_first_python_code_block(full_text) if needs_plot else ""
+    return join_sql_code(get_first_code_block(full_text, "sql"), plot_code)
+
+def generate_code_from_query(user_question: str, data_frame: pd.DataFrame, extra_context: str = "", version: int = None):
+    """Generate Python code using LLM based on user's question and dataset."""
+
+    # Decide whether the question is asking for a plot or just analysis
+    with stage("classify_intent"):
+        needs_plot = is_visual_query(user_question)
+
+    with stage("build_prompt"):
+        messages = build_code_messages(user_question, data_frame, needs_plot, extra_context, version)
+
     # Call the language model to generate code
-    response = client.chat.completions.create(
-        model=GROQ_MODEL,
-        messages=messages,
-        temperature=0.2
-    )
+    with stage("generate_code"):
+        started = time.perf_counter()
+        response = client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            temperature=0.2
+        )
+        record_llm_call("generate_code", started, response)
+
+    # Extract the actual code from the response
+    full_text = response.choices[0].message.content
+    generated_code = extract_generated_code(full_text, needs_plot)
+
+    return generated_code, needs_plot
+
+async def generate_code_from_query_async(user_question: str, data_frame: pd.DataFrame, extra_context: str = "", version: int = None, needs_plot: bool = None):
+    """Async version of generate_code_from_query for the API server; pass needs_plot if it is already known."""
+
+    if needs_plot is None:
+        with stage("classify_intent", cpu=False):
+            needs_plot = await is_visual_query_async(user_question)
+
+    # After a data change the schema profile is rebuilt, a full scan that must not block the event loop
+    with stage("build_prompt", cpu=False):
+        messages = await run_blocking(build_code_messages, user_question, data_frame, needs_plot, extra_context, version)
+
+    with stage("generate_code", cpu=False):
+        started = time.perf_counter()
+        response = await async_client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            temperature=0.2
+        )
+        record_llm_call("generate_code", started, response)
 
-    # Extract the actual Python code from the response
     full_text = response.choices[0].message.content
-    generated_code = get_first_python_code_block(full_text)
+    generated_code = extract_generated_code(full_text, needs_plot)
 
-    return generated_code, needs_plot
\ No newline at end of file
+    return generated_code, needs_plot
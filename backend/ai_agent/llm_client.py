@@ -1,12 +1,28 @@
 import os
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+
 client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
+    base_url=LLM_BASE_URL,
     api_key=os.getenv("GROQ_API_KEY")
 )
 
+# Async client for the API server; keeps a pool of open connections to the LLM provider
+async_client = AsyncOpenAI(
+    base_url=LLM_BASE_URL,
+    api_key=os.getenv("GROQ_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS
+        )
+    )
+)
+
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
\ No newline at end of file
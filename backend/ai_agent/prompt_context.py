@@ -0,0 +1,90 @@
+import os
+import threading
+import pandas as pd
+from ai_agent.code_prompt_templates import plot_prompt_prefix, analysis_prompt_prefix, sql_plot_prompt_prefix, sql_analysis_prompt_prefix
+from sql_store import SQL_BACKEND
+
+# ------------------ Prompt Context Setup ------------------
+# The schema profile and the question-independent part of the code prompts are built
+# once per dataset version and reused for every query on that version.
+PROMPT_SAMPLE_ROWS = int(os.getenv("PROMPT_SAMPLE_ROWS", "3"))
+PROMPT_MAX_LISTED_VALUES = 20
+
+_profile = (None, None)  # (version, profile text)
+_prefixes = {}  # needs_plot -> (version, extra_context, prefix)
+_lock = threading.Lock()
+_profile_lock = threading.Lock()  # one profile build at a time; concurrent queries wait for it
+prompt_context_stats = {"hits": 0, "misses": 0}
+
+def _percent_null(values: pd.Series) -> str:
+    return f"{values.isna().mean() * 100:.1f}% null" if len(values) else "no rows"
+
+def _list_values(values) -> str:
+    values = [str(value) for value in values]
+    listed = ", ".join(values[:PROMPT_MAX_LISTED_VALUES])
+    if len(values) > PROMPT_MAX_LISTED_VALUES:
+        listed += f", ... ({len(values) - PROMPT_MAX_LISTED_VALUES} more)"
+    return listed
+
+def _describe_column(name: str, values: pd.Series) -> str:
+    dtype = str(values.dtype)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        present = values.cat.remove_unused_categories().cat.categories
+        return f"- {name}: {dtype}, {len(present)} distinct: {_list_values(present)}"
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return f"- {name}: {dtype}, {values.min()} to {values.max()}, {_percent_null(values)}"
+    if pd.api.types.is_bool_dtype(values):
+        return f"- {name}: {dtype}, {_percent_null(values)}"
+    if pd.api.types.is_numeric_dtype(values):
+        return f"- {name}: {dtype}, range {values.min():g} to {values.max():g}, {_percent_null(values)}"
+
+    distinct = values.dropna().unique()
+    if len(distinct) <= PROMPT_MAX_LISTED_VALUES:
+        return f"- {name}: {dtype}, {len(distinct)} distinct: {_list_values(distinct)}, {_percent_null(values)}"
+    return f"- {name}: {dtype} (text), {len(distinct)} distinct, {_percent_null(values)}"
+
+def profile_dataframe(data: pd.DataFrame) -> str:
+    """
+    Compact schema description: dtype, value range / distinct values and null share per
+    column, plus a few sample rows to show the value formats.
+    """
+    lines = [f"Schema ({len(data)} rows):"]
+    lines += [_describe_column(name, data[name]) for name in data.columns]
+    sample_rows = data.head(PROMPT_SAMPLE_ROWS).to_string(index=False)
+    return "\n".join(lines) + f"\n\nSample rows:\n{sample_rows}\n"
+
+def _profile_data(data) -> str:
+    # In SQL mode the dataset is the Parquet archive, profiled with queries
+    return data.profile() if SQL_BACKEND else profile_dataframe(data)
+
+def _prefix_builder(needs_plot: bool):
+    if SQL_BACKEND:
+        return sql_plot_prompt_prefix if needs_plot else sql_analysis_prompt_prefix
+    return plot_prompt_prefix if needs_plot else analysis_prompt_prefix
+
+def code_prompt_prefix(data: pd.DataFrame, needs_plot: bool, extra_context: str = "", version: int = None) -> str:
+    """
+    Returns the question-independent prompt text for the given dataset version, building it
+    only when the version (or the extra context) changed. With version=None nothing is cached.
+    """
+    global _profile
+    build = _prefix_builder(needs_plot)
+    if version is None:
+        return build(_profile_data(data), extra_context)
+
+    with _lock:
+        cached = _prefixes.get(needs_plot)
+        if cached is not None and cached[0] == version and cached[1] == extra_context:
+            prompt_context_stats["hits"] += 1
+            return cached[2]
+
+    with _profile_lock:
+        profile = _profile[1] if _profile[0] == version else None
+        if profile is None:
+            profile = _profile_data(data)
+            _profile = (version, profile)
+    prefix = build(profile, extra_context)
+    with _lock:
+        prompt_context_stats["misses"] += 1
+        _prefixes[needs_plot] = (version, extra_context, prefix)
+    return prefix
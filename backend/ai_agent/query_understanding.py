@@ -1,13 +1,141 @@
-from ai_agent.llm_client import client, GROQ_MODEL
+import asyncio
+import os
+import re
+import threading
+import time
+from ai_agent.llm_client import client, async_client, GROQ_MODEL
+from ai_agent.worker_pool import run_blocking
+from ai_agent.tracing import record_llm_call
 
-def is_visual_query(user_question: str) -> bool:
+# ------------------ Local Intent Classifier ------------------
+# Obvious questions are classified locally; only unclear ones pay for an LLM round-trip.
+INTENT_EMBEDDINGS = os.getenv("INTENT_EMBEDDINGS", "true").lower() == "true"
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.08"))
+
+# "draw" and "pie" alone ("draw conclusions") don't count: "draw a graph" already matches
+# on its chart word, and "pie" only as "pie chart"; the rest is left to the embeddings/LLM
+VISUAL_PATTERN = re.compile(
+    r"\b(plot|chart|graph|visuali[sz]\w*|diagram|histogram|heat\s?map|scatter|pie\s?chart|"
+    r"bar\s?(chart|graph)|line\s?(chart|graph)|boxplot|box\s?plot)s?\b",
+    re.IGNORECASE
+)
+TEXT_PATTERN = re.compile(
+    r"\b(list|which room|what (is|was|are|were) the|how many|how much|table|count|rank|"
+    r"top \d+|highest|lowest|maximum|minimum)\b",
+    re.IGNORECASE
+)
+# Words that often mean "show me the shape of the data"; leave these to the embeddings/LLM
+AMBIGUOUS_PATTERN = re.compile(
+    r"\b(trends?|over time|vary|varies|distribution|compare|comparison|patterns?|show)\b",
+    re.IGNORECASE
+)
+
+VISUAL_EXEMPLARS = [
+    "Plot CO2 levels over time for each room",
+    "Show a chart of average temperature by room",
+    "Visualize humidity trends during the week",
+    "Draw a bar graph comparing rooms",
+    "Show me how temperature changes throughout the day",
+    "Display the daily CO2 trend for Room 1",
+    "Compare hourly humidity across rooms in a line chart",
+    "Give me a histogram of temperature readings",
+]
+TEXT_EXEMPLARS = [
+    "Which room had the highest temperature on July 12?",
+    "What is the average CO2 level in Room 2?",
+    "List the rooms from hottest to coolest",
+    "How many readings exceeded 1000 ppm?",
+    "What was the maximum humidity yesterday?",
+    "Which room had the biggest variation in CO2 levels?",
+    "Give the average temperature per room in the mornings and evenings",
+    "Tell me the minimum temperature for each room",
+]
+
+intent_stats = {"rules": 0, "embeddings": 0, "llm_fallback": 0}
+_exemplar_embeddings = None
+_exemplar_lock = threading.Lock()
+
+def _classify_by_rules(user_question: str):
+    if VISUAL_PATTERN.search(user_question):
+        return True
+    if TEXT_PATTERN.search(user_question) and not AMBIGUOUS_PATTERN.search(user_question):
+        return False
+    return None
+
+def rule_intent(user_question: str):
     """
-    Checks if the user is asking for a chart or visual output.
-    Uses the LLM to detect if the question needs a plot.
-    Returns True if it's a visual request, otherwise False.
+    Chart intent from the keyword rules alone (True/False, None if unclear): instant, no model or stats.
     """
-    
-    messages = [
+    return _classify_by_rules(user_question)
+
+def _classify_by_embeddings(user_question: str):
+    """
+    Compares the question with labeled exemplars using the MiniLM model from data_loader.
+    Returns None when the closest visual and non-visual exemplars are too close to call.
+    """
+    from sentence_transformers import util
+
+    model, (visual_embeds, text_embeds) = _exemplar_model()
+
+    query_embed = model.encode(user_question, convert_to_tensor=True)
+    visual_score = float(util.cos_sim(query_embed, visual_embeds).max())
+    text_score = float(util.cos_sim(query_embed, text_embeds).max())
+
+    if abs(visual_score - text_score) < INTENT_MIN_MARGIN:
+        return None
+    return visual_score > text_score
+
+def _exemplar_model():
+    # (model, (visual, text) exemplar embeddings), encoded once
+    global _exemplar_embeddings
+    from data_loader import get_model
+
+    model, _ = get_model()
+    if _exemplar_embeddings is None:
+        with _exemplar_lock:
+            if _exemplar_embeddings is None:
+                _exemplar_embeddings = (
+                    model.encode(VISUAL_EXEMPLARS, convert_to_tensor=True),
+                    model.encode(TEXT_EXEMPLARS, convert_to_tensor=True)
+                )
+    return model, _exemplar_embeddings
+
+def warm_up_embeddings():
+    """
+    Loads the embedding model (and the intent exemplars) ahead of the first query.
+    """
+    if INTENT_EMBEDDINGS:
+        _exemplar_model()
+    else:
+        from data_loader import get_model
+        get_model()
+
+def classify_visual_intent(user_question: str):
+    """
+    Classifies the question locally: keyword rules first, then exemplar embeddings.
+    Returns True/False, or None when the LLM should decide.
+    """
+    answer = _classify_by_rules(user_question)
+    if answer is not None:
+        intent_stats["rules"] += 1
+        return answer
+
+    if INTENT_EMBEDDINGS:
+        try:
+            answer = _classify_by_embeddings(user_question)
+        except Exception as e:
+            print(f"[⚠️] Embedding intent check failed: {e}")
+            answer = None
+        if answer is not None:
+            intent_stats["embeddings"] += 1
+            return answer
+
+    intent_stats["llm_fallback"] += 1
+    return None
+
+# ------------------ LLM Intent Check ------------------
+def build_visual_query_messages(user_question: str) -> list:
+    return [
         {
             "role": "system",
             "content": (
@@ -19,12 +147,110 @@ def is_visual_query(user_question: str) -> bool:
         {"role": "user", "content": user_question}
     ]
 
+def is_visual_query_llm(user_question: str) -> bool:
+    """
+    Uses the LLM to detect if the question needs a plot.
+    """
+    started = time.perf_counter()
     response = client.chat.completions.create(
         model=GROQ_MODEL,
-        messages=messages,
+        messages=build_visual_query_messages(user_question),
         temperature=0.1,
         max_tokens=5
     )
+    record_llm_call("classify_intent", started, response)
 
     answer = response.choices[0].message.content.strip().lower()
     return answer == "true"
+
+async def is_visual_query_llm_async(user_question: str) -> bool:
+    started = time.perf_counter()
+    response = await async_client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=build_visual_query_messages(user_question),
+        temperature=0.1,
+        max_tokens=5
+    )
+    record_llm_call("classify_intent", started, response)
+
+    answer = response.choices[0].message.content.strip().lower()
+    return answer == "true"
+
+def is_visual_query(user_question: str) -> bool:
+    """
+    Checks if the user is asking for a chart or visual output.
+    Answers locally for obvious questions and asks the LLM only when unsure.
+    Returns True if it's a visual request, otherwise False.
+    """
+    answer = classify_visual_intent(user_question)
+    if answer is None:
+        answer = is_visual_query_llm(user_question)
+    return answer
+
+async def is_visual_query_async(user_question: str) -> bool:
+    """
+    Async version of is_visual_query for the API server.
+    """
+    # The embedding step is CPU work, so it runs on the execution pool
+    answer = await run_blocking(classify_visual_intent, user_question)
+    if answer is None:
+        answer = await is_visual_query_llm_async(user_question)
+    return answer
+
+# ------------------ Batch Intent Check ------------------
+BATCH_ANSWER_PATTERN = re.compile(r"(\d+)\s*[:.)\-]\s*(true|false)", re.IGNORECASE)
+
+def build_visual_batch_messages(questions: list) -> list:
+    numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    return [
+        {
+            "role": "system",
+            "content": (
+                "detailed thinking off. You are an assistant that determines if queries are requesting a data visualization. "
+                "You get numbered queries. For each one, answer on its own line as '<number>: true' if it is asking for a plot, "
+                "chart, graph, or any visual representation of data, otherwise '<number>: false'. Output nothing else."
+            )
+        },
+        {"role": "user", "content": numbered}
+    ]
+
+async def is_visual_query_llm_batch_async(questions: list) -> list:
+    """
+    Classifies several questions with one LLM call. Questions the reply doesn't cover
+    are asked about one by one; None for any whose separate call failed too.
+    """
+    if len(questions) == 1:
+        return [await is_visual_query_llm_async(questions[0])]
+
+    started = time.perf_counter()
+    response = await async_client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=build_visual_batch_messages(questions),
+        temperature=0.1,
+        max_tokens=8 * len(questions)
+    )
+    record_llm_call("classify_intent_batch", started, response)
+
+    parsed = {}
+    for number, answer in BATCH_ANSWER_PATTERN.findall(response.choices[0].message.content or ""):
+        parsed.setdefault(int(number) - 1, answer.lower() == "true")
+    missing = [i for i in range(len(questions)) if i not in parsed]
+    if missing:
+        answers = await asyncio.gather(
+            *(is_visual_query_llm_async(questions[i]) for i in missing), return_exceptions=True
+        )
+        parsed.update((i, None if isinstance(answer, Exception) else answer) for i, answer in zip(missing, answers))
+    return [parsed[i] for i in range(len(questions))]
+
+async def is_visual_query_batch_async(questions: list) -> list:
+    """
+    Chart intent for many questions: each is classified locally first, and all the
+    unclear ones share a single LLM call. None where it couldn't be decided.
+    """
+    answers = await run_blocking(lambda: [classify_visual_intent(question) for question in questions])
+    unsure = [i for i, answer in enumerate(answers) if answer is None]
+    if unsure:
+        llm_answers = await is_visual_query_llm_batch_async([questions[i] for i in unsure])
+        for i, answer in zip(unsure, llm_answers):
+            answers[i] = answer
+    return answers
@@ -0,0 +1,188 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from ai_agent.table_store import table_store, TABLE_PAGE_SIZE
+from ai_agent.query_understanding import rule_intent
+
+# ------------------ Cache Setup ------------------
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_FULL = os.getenv("RESPONSE_CACHE_FULL", "false").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+
+SYNONYMS = {
+    "avg": "average",
+    "mean": "average",
+    "temp": "temperature",
+    "temps": "temperature",
+    "hum": "humidity",
+    "rh": "humidity",
+    "co₂": "co2",
+    "max": "maximum",
+    "min": "minimum",
+    "per": "by",
+    "each": "by",
+    "plots": "plot",
+    "chart": "plot",
+    "charts": "plot",
+    "graph": "plot",
+    "graphs": "plot",
+    "visualize": "plot",
+    "visualise": "plot",
+    "tables": "table",
+    "sum": "total",
+    "number": "count",
+    "except": "excluding",
+    "exclude": "excluding",
+    "without": "excluding",
+    # "don't" tokenizes as "don" + "t"
+    "don": "not",
+    "doesn": "not",
+    "didn": "not",
+    "isn": "not",
+    "aren": "not",
+    "wasn": "not",
+    "weren": "not",
+}
+# Words that change the answer even when the rest of the sentence is nearly identical.
+# Two questions only share a cache entry if these (and all numbers) match exactly.
+LITERAL_WORDS = {
+    "co2", "temperature", "humidity",
+    "plot", "table", "list", "histogram", "scatter", "pie", "bar", "line",
+    "average", "median", "total", "count", "mode", "variance", "deviation", "std", "range", "percent", "percentage",
+    "maximum", "minimum", "highest", "lowest", "most", "least", "top", "bottom",
+    "hottest", "warmest", "coolest", "coldest", "increase", "decrease", "above", "below",
+    "not", "no", "never", "excluding", "only", "over", "under", "more", "less", "fewer", "greater", "than", "between",
+    "today", "yesterday", "week", "month", "morning", "mornings", "evening", "evenings",
+    "night", "weekend", "weekday", "hour", "hourly", "daily", "weekly",
+    "january", "february", "march", "april", "may", "june", "july",
+    "august", "september", "october", "november", "december",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+}
+
+def normalize_question(question: str) -> str:
+    words = re.findall(r"[a-z0-9₂.]+", question.lower())
+    words = [SYNONYMS.get(word.strip("."), word.strip(".")) for word in words]
+    return " ".join(word for word in words if word)
+
+def _literal_tokens(normalized: str) -> frozenset:
+    return frozenset(word for word in normalized.split() if word in LITERAL_WORDS or any(c.isdigit() for c in word))
+
+# ------------------ ResponseCache ------------------
+class ResponseCache:
+    """
+    LRU cache of generated code (and optionally whole responses) keyed on the normalized
+    question and the dataset version. Near-duplicate questions match through MiniLM
+    embeddings when their cosine similarity is above the threshold and their literal
+    words and rule-based chart intent are the same.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, threshold=RESPONSE_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed(self, normalized):
+        try:
+            from data_loader import get_model
+            model, _ = get_model()
+            return model.encode(normalized, convert_to_tensor=True, normalize_embeddings=True)
+        except Exception as e:
+            print(f"[⚠️] Response cache embedding failed: {e}")
+            return None
+
+    def lookup(self, question: str, version: int):
+        """
+        Returns (entry, key). entry is None on a miss; pass key to store() afterwards.
+        """
+        normalized = normalize_question(question)
+        key = {
+            "normalized": normalized,
+            "literals": _literal_tokens(normalized),
+            "intent": rule_intent(question),
+            "embedding": None
+        }
+        now = time.monotonic()
+
+        with self._lock:
+            for cached_key in [k for k, e in self._entries.items() if now - e["created"] > self.ttl]:
+                del self._entries[cached_key]
+
+            entry = self._entries.get((normalized, version))
+            if entry is not None:
+                self._entries.move_to_end((normalized, version))
+                self.stats["exact_hits"] += 1
+                return entry, key
+
+            candidates = [
+                (cached_key, e) for cached_key, e in self._entries.items()
+                if cached_key[1] == version and e["literals"] == key["literals"] and e["intent"] == key["intent"]
+                and e["embedding"] is not None
+            ]
+
+        key["embedding"] = self._embed(normalized)
+        if key["embedding"] is not None and candidates:
+            from sentence_transformers import util
+            best_key, best_entry, best_score = None, None, -1.0
+            for cached_key, e in candidates:
+                score = float(util.dot_score(key["embedding"], e["embedding"])[0][0])
+                if score > best_score:
+                    best_key, best_entry, best_score = cached_key, e, score
+            if best_score >= self.threshold:
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.stats["semantic_hits"] += 1
+                return best_entry, key
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None, key
+
+    def store(self, key, version: int, code: str, needs_plot: bool, response: dict = None):
+        table = None
+        if not RESPONSE_CACHE_FULL:
+            response = None
+        elif response is not None and response.get("table_info"):
+            # The table store can drop the result id long before this entry expires, so the
+            # table itself is kept and registered again on each hit (see cached_response)
+            table = table_store.get(response["table_info"]["result_id"])
+            response = dict(response, table_info=None)
+        entry = {
+            "code": code,
+            "needs_plot": needs_plot,
+            "response": response,
+            "table": table,
+            "literals": key["literals"],
+            "intent": key["intent"],
+            "embedding": key["embedding"],
+            "created": time.monotonic(),
+        }
+        with self._lock:
+            self._entries[(key["normalized"], version)] = entry
+            self._entries.move_to_end((key["normalized"], version))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, *_):
+        with self._lock:
+            self._entries.clear()
+
+def cached_response(entry: dict) -> dict:
+    """
+    A copy of a cached full response, with its table stored again under a new result id for paging.
+    """
+    response = dict(entry["response"])
+    table = entry["table"]
+    if table is not None:
+        result_id = table_store.put(table)
+        response["table_info"] = table_store.page_info(result_id, table, 0, TABLE_PAGE_SIZE)
+    return response
+
+response_cache = ResponseCache()
@@ -1,9 +1,12 @@
-import os
-import uuid
+import asyncio
 import pandas as pd
 import matplotlib.pyplot as plt
 import re
-from ai_agent.summarize_result import explain_result_to_user
+from ai_agent.summarize_result import explain_result_to_user, explain_result_to_user_async
+from ai_agent.worker_pool import run_blocking
+from ai_agent.chart_store import chart_store
+from ai_agent.tracing import stage
+from ai_agent.table_store import TableResult, table_store, to_records, TABLE_PAGE_SIZE
 
 # ------------------ format_column_name ----------------------------------
 def format_column_name(column: str) -> str:
@@ -20,67 +23,86 @@ def format_column_name(column: str) -> str:
     words = spaced.strip().split()
     return ' '.join(word.capitalize() for word in words)
 
-# ------------------ create_response_package ------------------------------
-def create_response_package(user_question, chart_object, is_plot, table_object=None):
+# ------------------ build_response_assets ------------------------------
+def format_table(chart_object, is_plot, table_object=None) -> dict:
     """
-    Combines the explanation, table formatting, and chart saving into one result dictionary.
+    Stores the table result and returns its first page: {"table": rows as dicts,
+    "table_info": result id, size and paging info}. Both are None if there is no table.
     """
+    with stage("format_table"):
+        return _format_table(chart_object, is_plot, table_object)
 
-    # Use table for explanation if available, otherwise use chart
-    explanation_input = table_object if table_object is not None else chart_object
-    summary = explain_result_to_user(user_question, explanation_input)
+def _display_names(chart_object, is_plot, table_object):
+    # Rename columns using legend labels or just beautify them
+    if isinstance(table_object, pd.DataFrame) and is_plot and isinstance(chart_object, (plt.Figure, plt.Axes)):
+        ax = chart_object.gca() if isinstance(chart_object, plt.Figure) else chart_object
+        legend = ax.get_legend()
+        legend_labels = [label.get_text() for label in legend.get_texts()] if legend else []
+        if legend_labels:
+            value_columns = [
+                col for col in table_object.columns
+                if pd.api.types.is_numeric_dtype(table_object[col]) and not pd.api.types.is_bool_dtype(table_object[col])
+            ]
+            if len(value_columns) == len(legend_labels):
+                rename_map = dict(zip(value_columns, legend_labels))
+                return lambda col: rename_map.get(col, col)
+    return lambda col: format_column_name(str(col))
 
-    # Prepare table data (if any)
-    table_data = None
+def _format_table(chart_object, is_plot, table_object=None) -> dict:
+    if not isinstance(table_object, (pd.DataFrame, pd.Series)):
+        return {"table": None, "table_info": None}
 
-    if isinstance(table_object, pd.DataFrame):
-        df = table_object.copy()
+    # The full result stays on the server; only the first page is sent now
+    table = TableResult(table_object, _display_names(chart_object, is_plot, table_object))
+    result_id = table_store.put(table)
+    return {
+        "table": to_records(table.page(0, TABLE_PAGE_SIZE)),
+        "table_info": table_store.page_info(result_id, table, 0, TABLE_PAGE_SIZE)
+    }
 
-        # Try to extract chart legend labels
-        legend_labels = []
-        if is_plot and isinstance(chart_object, (plt.Figure, plt.Axes)):
-            ax = chart_object.gca() if isinstance(chart_object, plt.Figure) else chart_object
-            legend = ax.get_legend()
-            if legend:
-                legend_labels = [label.get_text() for label in legend.get_texts()]
+def save_chart(chart_object, is_plot):
+    """
+    Stores the figure (if any) in the chart store and returns its path.
+    """
+    chart_path = None
+    if is_plot and isinstance(chart_object, (plt.Figure, plt.Axes)):
+        with stage("save_chart"):
+            chart_path = f"charts/{chart_store.save(chart_object)}"
 
-        # Rename columns using legend labels or just beautify them
-        if legend_labels:
-            value_columns = [col for col in df.columns if df[col].dtype in ['float64', 'int64']]
-            if len(value_columns) == len(legend_labels):
-                rename_map = {value_columns[i]: legend_labels[i] for i in range(len(value_columns))}
-                df.rename(columns=rename_map, inplace=True)
-            else:
-                df.rename(columns=lambda col: format_column_name(str(col)), inplace=True)
-        else:
-            df.rename(columns=lambda col: format_column_name(str(col)), inplace=True)
+    return chart_path
 
-        # Round numbers for better display
-        rounded_df = df.copy()
-        for col in rounded_df.select_dtypes(include='number').columns:
-            rounded_df[col] = rounded_df[col].round(2)
+def build_response_assets(chart_object, is_plot, table_object=None) -> dict:
+    """
+    Formats the table and saves the chart. Returns the table, table_info and chart_path fields.
+    """
+    assets = format_table(chart_object, is_plot, table_object)
+    assets["chart_path"] = save_chart(chart_object, is_plot)
+    return assets
 
-        table_data = rounded_df.head(20).to_dict(orient="records")
+# ------------------ create_response_package ------------------------------
+def create_response_package(user_question, chart_object, is_plot, table_object=None):
+    """
+    Combines the explanation, table formatting, and chart saving into one result dictionary.
+    """
 
-    elif isinstance(table_object, pd.Series):
-        df = table_object.to_frame().reset_index()
-        df.rename(columns=lambda col: format_column_name(str(col)), inplace=True)
-        table_data = df.to_dict(orient="records")
+    # Use table for explanation if available, otherwise use chart
+    explanation_input = table_object if table_object is not None else chart_object
+    summary = explain_result_to_user(user_question, explanation_input)
 
-    # Save chart to file
-    chart_path = None
-    if is_plot and isinstance(chart_object, (plt.Figure, plt.Axes)):
-        fig = chart_object.figure if isinstance(chart_object, plt.Axes) else chart_object
-        output_folder = "charts"
-        os.makedirs(output_folder, exist_ok=True)
-        filename = f"{uuid.uuid4().hex[:8]}.png"
-        full_path = os.path.join(output_folder, filename)
-        fig.savefig(full_path)
-        chart_path = f"{output_folder}/{filename}"
+    assets = build_response_assets(chart_object, is_plot, table_object)
 
     # Final response with all parts
-    return {
-        "summary": summary,
-        "table": table_data,
-        "chart_path": chart_path
-    }
+    return {"summary": summary, **assets}
+
+async def create_response_package_async(user_question, chart_object, is_plot, table_object=None):
+    """
+    Async version of create_response_package: the summary LLM call runs while
+    the table and chart are prepared on the execution pool.
+    """
+    explanation_input = table_object if table_object is not None else chart_object
+    summary, assets = await asyncio.gather(
+        explain_result_to_user_async(user_question, explanation_input),
+        run_blocking(build_response_assets, chart_object, is_plot, table_object)
+    )
+
+    return {"summary": summary, **assets}
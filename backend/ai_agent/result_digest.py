@@ -0,0 +1,138 @@
+import os
+import reprlib
+import numpy as np
+import pandas as pd
+
+# ------------------ Result Digest Setup ------------------
+# The summary LLM sees a fixed-size digest of the result (shape, column stats, extreme
+# rows, trends) rather than its printed text, so building the prompt never stringifies
+# a large result and the prompt stays the same size however many rows come back.
+SUMMARY_TOP_K = int(os.getenv("SUMMARY_TOP_K", "5"))  # rows shown from each end
+SUMMARY_MAX_COLUMNS = int(os.getenv("SUMMARY_MAX_COLUMNS", "12"))
+SUMMARY_DIGEST_CHARS = int(os.getenv("SUMMARY_DIGEST_CHARS", "3000"))  # hard cap on the digest text
+SUMMARY_MAX_LISTED_VALUES = 3
+
+_repr = reprlib.Repr()
+_repr.maxstring = 300
+_repr.maxother = 300
+_repr.maxlist = _repr.maxtuple = _repr.maxdict = _repr.maxset = 20
+
+def _fmt(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return "NaN" if value != value else f"{value:.4g}"
+    return str(value)
+
+def _is_number(values: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+def _as_frame(data) -> pd.DataFrame:
+    if isinstance(data, pd.Series):
+        return data.to_frame(name=data.name if data.name is not None else "value")
+    return data
+
+def _columns(frame: pd.DataFrame):
+    # (name, values) pairs by position, so duplicate column names are handled too
+    return [(name, frame.iloc[:, position]) for position, name in enumerate(frame.columns)]
+
+def _time_axis(frame: pd.DataFrame):
+    # (label, values) of the result's time axis: a DatetimeIndex or the first datetime column
+    if isinstance(frame.index, pd.DatetimeIndex):
+        return frame.index.name or "index", pd.Series(frame.index, index=frame.index)
+    for name, values in _columns(frame):
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return name, values
+    return None, None
+
+def _column_stats(frame: pd.DataFrame) -> list:
+    lines = []
+    for name, values in _columns(frame)[:SUMMARY_MAX_COLUMNS]:
+        missing = int(values.isna().sum())
+        suffix = f", {missing} missing" if missing else ""
+        if _is_number(values):
+            lines.append(
+                f"- {name}: min {_fmt(values.min())}, max {_fmt(values.max())}, mean {_fmt(values.mean())}{suffix}"
+            )
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            lines.append(f"- {name}: {values.min()} to {values.max()}{suffix}")
+        else:
+            try:
+                counts = values.value_counts()
+            except TypeError:  # unhashable cells such as lists
+                lines.append(f"- {name}: {values.dtype}{suffix}")
+                continue
+            counts = counts[counts > 0]  # unused categories
+            common = ", ".join(f"{value} ({count})" for value, count in counts.head(SUMMARY_MAX_LISTED_VALUES).items())
+            lines.append(f"- {name}: {len(counts)} distinct, most common {common}{suffix}")
+    if len(frame.columns) > SUMMARY_MAX_COLUMNS:
+        lines.append(f"- ... {len(frame.columns) - SUMMARY_MAX_COLUMNS} more columns")
+    return lines
+
+def _rows_text(rows: pd.DataFrame) -> str:
+    show_index = not isinstance(rows.index, pd.RangeIndex)
+    return rows.iloc[:, :SUMMARY_MAX_COLUMNS].to_string(index=show_index, float_format=_fmt)
+
+def _extreme_rows(frame: pd.DataFrame) -> list:
+    if len(frame) <= 2 * SUMMARY_TOP_K:
+        return ["All rows:", _rows_text(frame)]
+
+    numbers = [name for name, values in _columns(frame) if _is_number(values)]
+    if not numbers or not frame.columns.is_unique:
+        return [f"First {SUMMARY_TOP_K} rows:", _rows_text(frame.head(SUMMARY_TOP_K))]
+    key = numbers[0]
+    return [
+        f"Top {SUMMARY_TOP_K} rows by {key}:", _rows_text(frame.nlargest(SUMMARY_TOP_K, key)),
+        f"Bottom {SUMMARY_TOP_K} rows by {key}:", _rows_text(frame.nsmallest(SUMMARY_TOP_K, key)),
+    ]
+
+def _trends(frame: pd.DataFrame, time_label, times: pd.Series) -> list:
+    # Least-squares slope of each numeric column against time, per day
+    days = ((times - times.min()) / pd.Timedelta(days=1)).to_numpy(dtype="float64", na_value=np.nan)
+    lines = []
+    numbers = [(name, values) for name, values in _columns(frame) if _is_number(values)]
+    for name, values in numbers[:SUMMARY_MAX_COLUMNS]:
+        values = values.to_numpy(dtype="float64", na_value=np.nan)
+        mask = np.isfinite(days) & np.isfinite(values)
+        if mask.sum() < 3:
+            continue
+        x, y = days[mask], values[mask]
+        spread = ((x - x.mean()) ** 2).sum()
+        if spread == 0:
+            continue
+        slope = ((x - x.mean()) * (y - y.mean())).sum() / spread
+        lines.append(f"- {name}: {slope:+.4g} per day over {x.max() - x.min():.4g} days")
+    return [f"Trend against {time_label}:"] + lines if lines else []
+
+def digest_table(data) -> str:
+    """
+    Bounded-size description of a DataFrame or Series: shape, per-column stats,
+    top/bottom rows and, for time-ordered results, the trend of each numeric column.
+    """
+    frame = _as_frame(data)
+    rows, columns = frame.shape
+    parts = [f"Table with {rows} rows and {columns} columns."]
+    if rows == 0:
+        return parts[0]
+
+    time_label, times = _time_axis(frame)
+    parts += ["Column summary:"] + _column_stats(frame)
+    parts += _extreme_rows(frame)
+    if times is not None and rows > 2:
+        parts += _trends(frame, time_label, times)
+    return "\n".join(parts)
+
+def digest_result(result) -> str:
+    """
+    Text for the summary prompt describing any result the generated code returned,
+    capped at SUMMARY_DIGEST_CHARS.
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        text = digest_table(result)
+    elif isinstance(result, str):
+        text = result[:SUMMARY_DIGEST_CHARS]
+    elif isinstance(result, (int, float, np.generic)):
+        text = _fmt(result)
+    else:
+        text = _repr.repr(result)
+    if len(text) > SUMMARY_DIGEST_CHARS:
+        text = text[:SUMMARY_DIGEST_CHARS] + "\n... (truncated)"
+    return text
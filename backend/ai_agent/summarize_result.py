@@ -1,6 +1,30 @@
+import time
 from typing import Any
-from ai_agent.llm_client import client, GROQ_MODEL
+from ai_agent.llm_client import client, async_client, GROQ_MODEL
 from ai_agent.build_summary_prompt import create_reasoning_prompt
+from ai_agent.tracing import stage, record_llm_call
+from ai_agent.worker_pool import run_blocking
+
+def build_summary_messages(user_question: str, result_data: Any, table_info: Any = None) -> list:
+    # Prepare the input message for the LLM
+    prompt_text = create_reasoning_prompt(user_question, result_data, table_info)
+
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are a senior data analyst. If the result contains valid data, explain the findings clearly in 3–5 user-friendly sentences. "
+                "Focus on patterns, comparisons, or anomalies. Avoid generic phrases like 'This analysis shows...' — get straight to the insight. "
+                "If the result indicates an error or failed code execution, DO NOT include technical error messages. "
+                "Instead, briefly explain that something went wrong and suggest the user rephrase the question or try again later. "
+                "Keep the tone polite, professional, and reassuring."
+            )
+        },
+        {
+            "role": "user",
+            "content": prompt_text
+        }
+    ]
 
 def explain_result_to_user(user_question: str, result_data: Any, table_info: Any = None) -> str:
     """
@@ -8,30 +32,60 @@ def explain_result_to_user(user_question: str, result_data: Any, table_info: Any
     Returns a 3-5 sentence user-friendly summary.
     """
 
-    # Prepare the input message for the LLM
-    prompt_text = create_reasoning_prompt(user_question, result_data, table_info)
-
     # Ask the LLM to explain the result clearly and politely
-    response = client.chat.completions.create(
-        model=GROQ_MODEL,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a senior data analyst. If the result contains valid data, explain the findings clearly in 3–5 user-friendly sentences. "
-                    "Focus on patterns, comparisons, or anomalies. Avoid generic phrases like 'This analysis shows...' — get straight to the insight. "
-                    "If the result indicates an error or failed code execution, DO NOT include technical error messages. "
-                    "Instead, briefly explain that something went wrong and suggest the user rephrase the question or try again later. "
-                    "Keep the tone polite, professional, and reassuring."
-                )
-            },
-            {
-                "role": "user",
-                "content": prompt_text
-            }
-        ],
-        temperature=0.2,
-        max_tokens=512
-    )
+    with stage("summarize"):
+        messages = build_summary_messages(user_question, result_data, table_info)
+        started = time.perf_counter()
+        response = client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=512
+        )
+        record_llm_call("summarize", started, response)
+
+    return response.choices[0].message.content.strip()
+
+async def explain_result_to_user_async(user_question: str, result_data: Any, table_info: Any = None) -> str:
+    """
+    Async version of explain_result_to_user for the API server.
+    """
+    with stage("summarize", cpu=False):
+        # The result digest is O(rows) pandas work, so it runs on the execution pool
+        messages = await run_blocking(build_summary_messages, user_question, result_data, table_info)
+        started = time.perf_counter()
+        response = await async_client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=512
+        )
+        record_llm_call("summarize", started, response)
 
     return response.choices[0].message.content.strip()
+
+async def stream_result_explanation(user_question: str, result_data: Any, table_info: Any = None):
+    """
+    Streams the explanation from the LLM, yielding text pieces as they arrive.
+    """
+    with stage("summarize", cpu=False):
+        messages = await run_blocking(build_summary_messages, user_question, result_data, table_info)
+        started = time.perf_counter()
+        stream = await async_client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=512,
+            stream=True
+        )
+
+        pieces = 0
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                pieces += 1
+                yield delta
+        # Streamed replies carry no usage; each piece is roughly one token
+        record_llm_call("summarize", started, completion_tokens=pieces)
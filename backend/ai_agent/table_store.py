@@ -0,0 +1,147 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+import orjson
+import pandas as pd
+
+# ------------------ Table Store Setup ------------------
+# Table results are kept server-side under a result id and sent one page at a time,
+# so the first response costs the same for a 10-row summary and a per-reading Series.
+# Renaming and rounding only ever touch the rows of the page being sent.
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", "20"))  # rows in the /query response
+TABLE_MAX_PAGE_SIZE = int(os.getenv("TABLE_MAX_PAGE_SIZE", "1000"))
+TABLE_STORE_SIZE = int(os.getenv("TABLE_STORE_SIZE", "128"))  # results kept
+TABLE_STORE_TTL = float(os.getenv("TABLE_STORE_TTL", "3600"))  # seconds
+TABLE_DECIMALS = 2
+
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def dumps(payload) -> bytes:
+    """
+    Fast JSON encoding; NaN becomes null and anything unknown is sent as text.
+    """
+    return orjson.dumps(payload, default=str, option=JSON_OPTIONS)
+
+class TableResult:
+    """
+    A table or Series result with display column names, sliced lazily into pages.
+    """
+    def __init__(self, source, rename=None):
+        self.source = source
+        self.total_rows = len(source)
+        names = self._frame(0, 0).columns
+        self.columns = [rename(col) if rename else col for col in names]
+
+    def _frame(self, start, stop) -> pd.DataFrame:
+        rows = self.source.iloc[start:stop]
+        if isinstance(rows, pd.Series):
+            rows = rows.to_frame().reset_index()
+        return rows
+
+    def page(self, offset: int = 0, limit: int = TABLE_PAGE_SIZE) -> pd.DataFrame:
+        """
+        The rows [offset, offset + limit) with display names and numbers rounded for display.
+        """
+        page = self._frame(offset, offset + limit).set_axis(self.columns, axis=1)
+        for position in range(page.shape[1]):
+            values = page.iloc[:, position]
+            if pd.api.types.is_float_dtype(values):
+                # float32 sensor columns are widened first so 753.28 is not sent as 753.280029...
+                page.isetitem(position, values.astype("float64").round(TABLE_DECIMALS))
+        return page
+
+def _json_value(value):
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return None if value != value else value
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, pd.Timedelta):
+        return str(value)
+    if isinstance(value, np.generic):
+        return _json_value(value.item())
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(value)
+
+def column_values(values: pd.Series) -> list:
+    """
+    One page column as JSON-ready Python values (ISO timestamps, None for missing).
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return [None if value is pd.NaT else value.isoformat() for value in values]
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and values.hasnans:
+        # Nullable dtypes (Int16, boolean, Float32, ...) give pd.NA for missing values
+        return [_json_value(value) for value in values.astype(object).where(values.notna(), None).tolist()]
+    if values.dtype.kind in "iub":
+        return values.tolist()
+    if values.dtype.kind == "f":
+        return [None if value != value else value for value in values.tolist()]
+    return [_json_value(value) for value in values.tolist()]
+
+def to_columnar(page: pd.DataFrame) -> dict:
+    return {"columns": list(page.columns), "data": [column_values(page.iloc[:, i]) for i in range(page.shape[1])]}
+
+def to_records(page: pd.DataFrame) -> list:
+    columnar = to_columnar(page)
+    return [dict(zip(columnar["columns"], row)) for row in zip(*columnar["data"])]
+
+def to_arrow(page: pd.DataFrame) -> bytes:
+    """
+    The page as an Arrow IPC stream.
+    """
+    import pyarrow as pa
+    table = pa.Table.from_pandas(page, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+class TableStore:
+    def __init__(self, max_entries=TABLE_STORE_SIZE, ttl=TABLE_STORE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # result id -> (stored at, TableResult)
+        self._lock = threading.Lock()
+
+    def put(self, table: TableResult) -> str:
+        result_id = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._entries[result_id] = (time.monotonic(), table)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_id
+
+    def get(self, result_id: str):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[result_id]
+                return None
+            self._entries.move_to_end(result_id)
+            return entry[1]
+
+    def page_info(self, result_id: str, table: TableResult, offset: int, limit: int) -> dict:
+        next_offset = offset + limit
+        return {
+            "result_id": result_id,
+            "total_rows": table.total_rows,
+            "columns": table.columns,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset if next_offset < table.total_rows else None,
+        }
+
+table_store = TableStore()
@@ -0,0 +1,203 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# ------------------ Tracing Setup ------------------
+# Per-query stage timings, LLM calls and execution stats. A trace lives in a context
+# variable, so nested code records into the query that is currently running; when
+# tracing is off no trace is ever created and every hook returns right away.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_MEMORY = os.getenv("TRACE_MEMORY", "true").lower() == "true"  # tracemalloc peak during exec
+
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+TOKEN_BUCKETS = [16, 64, 256, 1024, 2048, 4096, 8192, 16384]
+ROW_BUCKETS = [1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8]
+BYTE_BUCKETS = [2 ** 20, 2 ** 22, 2 ** 24, 2 ** 26, 2 ** 28, 2 ** 30, 2 ** 32]
+
+_current = ContextVar("agent_trace", default=None)
+_noop = nullcontext()
+
+class Trace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}  # name -> {"wall_ms", "cpu_ms"}
+        self.llm_calls = []
+        self.rows_scanned = 0
+        self.peak_memory_bytes = None
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, wall, cpu=None):
+        with self._lock:
+            entry = self.stages.setdefault(name, {"wall_ms": 0.0, "cpu_ms": None})
+            entry["wall_ms"] = round(entry["wall_ms"] + wall * 1000, 3)
+            if cpu is not None:
+                entry["cpu_ms"] = round((entry["cpu_ms"] or 0.0) + cpu * 1000, 3)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "stages": self.stages,
+            "llm_calls": self.llm_calls,
+            "rows_scanned": self.rows_scanned,
+            "peak_memory_mb": None if self.peak_memory_bytes is None else round(self.peak_memory_bytes / 2 ** 20, 3),
+        }
+
+class _Stage:
+    __slots__ = ("trace", "name", "cpu", "wall_start", "cpu_start")
+
+    def __init__(self, trace, name, cpu):
+        self.trace, self.name, self.cpu = trace, name, cpu
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time() if self.cpu else None
+
+    def __exit__(self, *exc):
+        cpu = time.thread_time() - self.cpu_start if self.cpu else None
+        self.trace.add_stage(self.name, time.perf_counter() - self.wall_start, cpu)
+        return False
+
+def stage(name: str, cpu: bool = True):
+    """
+    Times a block as one stage of the current query. cpu=False for blocks that await
+    (the event loop thread's CPU time would include other requests).
+    """
+    trace = _current.get()
+    if trace is None:
+        return _noop
+    return _Stage(trace, name, cpu)
+
+def record_llm_call(name: str, started: float, response=None, completion_tokens: int = None):
+    """
+    Records one LLM call that began at `started` (perf_counter), with token usage if reported.
+    """
+    trace = _current.get()
+    if trace is None:
+        return
+    usage = getattr(response, "usage", None)
+    call = {
+        "call": name,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", completion_tokens),
+    }
+    with trace._lock:
+        trace.llm_calls.append(call)
+
+def record_execution(timings: dict):
+    """
+    Adds the executor's own measurements (compile/exec/query time, rows, peak memory) to the trace.
+    """
+    trace = _current.get()
+    if trace is None:
+        return
+    for key in ("compile_ms", "exec_ms", "load_ms", "query_ms"):
+        if key in timings:
+            trace.add_stage(f"execute.{key[:-3]}", timings[key] / 1000)
+    trace.rows_scanned += timings.get("rows_scanned", 0)
+    if timings.get("peak_memory_bytes") is not None:
+        trace.peak_memory_bytes = max(trace.peak_memory_bytes or 0, timings["peak_memory_bytes"])
+
+@contextmanager
+def request_trace():
+    """
+    Traces one query. Yields the Trace, or None when tracing is disabled; the trace is
+    added to the /metrics histograms when the block ends.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:  # generator closed from another context
+            pass
+        _observe(trace)
+
+# ------------------ Histograms ------------------
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_metrics = {}  # (metric name, label tuple) -> Histogram
+_metrics_lock = threading.Lock()
+_help = {
+    "agent_request_seconds": "Wall time of a whole query",
+    "agent_stage_seconds": "Wall time per pipeline stage",
+    "agent_stage_cpu_seconds": "CPU time per pipeline stage (threads doing the work only)",
+    "agent_llm_call_seconds": "Latency per LLM call",
+    "agent_llm_tokens": "Tokens per LLM call",
+    "agent_rows_scanned": "DataFrame rows referenced by the generated code",
+    "agent_exec_peak_memory_bytes": "Peak traced memory while running the generated code",
+}
+
+def _observe_value(metric, labels, buckets, value):
+    key = (metric, tuple(sorted(labels.items())))
+    histogram = _metrics.get(key)
+    if histogram is None:
+        histogram = _metrics[key] = Histogram(buckets)
+    histogram.observe(value)
+
+def _observe(trace: Trace):
+    with _metrics_lock:
+        _observe_value("agent_request_seconds", {}, SECONDS_BUCKETS, time.perf_counter() - trace.start)
+        for name, entry in trace.stages.items():
+            _observe_value("agent_stage_seconds", {"stage": name}, SECONDS_BUCKETS, entry["wall_ms"] / 1000)
+            if entry["cpu_ms"] is not None:
+                _observe_value("agent_stage_cpu_seconds", {"stage": name}, SECONDS_BUCKETS, entry["cpu_ms"] / 1000)
+        for call in trace.llm_calls:
+            _observe_value("agent_llm_call_seconds", {"call": call["call"]}, SECONDS_BUCKETS, call["latency_ms"] / 1000)
+            for kind in ("prompt", "completion"):
+                tokens = call[f"{kind}_tokens"]
+                if tokens is not None:
+                    _observe_value("agent_llm_tokens", {"call": call["call"], "kind": kind}, TOKEN_BUCKETS, tokens)
+        if trace.rows_scanned:
+            _observe_value("agent_rows_scanned", {}, ROW_BUCKETS, trace.rows_scanned)
+        if trace.peak_memory_bytes is not None:
+            _observe_value("agent_exec_peak_memory_bytes", {}, BYTE_BUCKETS, trace.peak_memory_bytes)
+
+def _format_number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _format_labels(labels, extra=None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+def render_metrics() -> str:
+    """
+    All histograms in the Prometheus text exposition format.
+    """
+    with _metrics_lock:
+        items = sorted(_metrics.items(), key=lambda item: item[0])
+        lines = []
+        previous = None
+        for (metric, labels), histogram in items:
+            if metric != previous:
+                lines.append(f"# HELP {metric} {_help.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+                previous = metric
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_number(bound)
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,19 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Bounded pool for the CPU-bound parts of a query (exec, pandas, chart rendering),
+# so they never run on the API server's event loop
+EXECUTION_WORKERS = int(os.getenv("EXECUTION_WORKERS", "4"))
+execution_pool = ThreadPoolExecutor(max_workers=EXECUTION_WORKERS, thread_name_prefix="agent-exec")
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function on the execution pool and awaits its result.
+    """
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (e.g. the query's trace) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(execution_pool, partial(context.run, func, *args, **kwargs))
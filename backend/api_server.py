@@ -1,19 +1,66 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from main import run_agent_pipeline
+import time
+_import_start = time.perf_counter()
+
+import asyncio
 import os
 import webbrowser
-import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from typing import List
+from pydantic import BaseModel, Field
+from main import run_agent_pipeline_async, run_agent_pipeline_stream, run_agent_batch_async, init_data, shutdown_data, is_ready, startup_timings
+from data_loader import schema_cache_stats, memory_stats
+from sql_store import archive_stats
+from ai_agent.query_understanding import intent_stats
+from ai_agent.response_cache import response_cache
+from ai_agent.code_executor import compile_stats
+from ai_agent.prompt_context import prompt_context_stats
+from ai_agent.chart_store import chart_store
+from ai_agent.tracing import render_metrics
+from static_assets import STATIC_MANIFEST, STATIC_DIR, INDEX_FILE, static_assets
+from ai_agent.table_store import table_store, dumps, to_arrow, to_columnar, to_records, TABLE_PAGE_SIZE, TABLE_MAX_PAGE_SIZE
+
+startup_timings["imports"] = round(time.perf_counter() - _import_start, 3)
+
+OPEN_BROWSER = os.getenv("OPEN_BROWSER", "true").lower() == "true"
+MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "32"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+
+# Queries in flight; new ones are rejected with 429 instead of queueing without bound
+query_slots = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
 
 def open_browser():
     webbrowser.open("http://localhost:8000")
 
-threading.Timer(1.0, open_browser).start()
+async def load_data_in_background():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, init_data)
+        startup_timings["total"] = round(time.perf_counter() - _import_start, 3)
+        print(f"🚀 Ready: {startup_timings}")
+    except Exception as e:
+        startup_timings["error"] = str(e)
+        print(f"[⚠️] Failed to load sensor data: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Frontend build indexed into memory before the first page request
+    if STATIC_MANIFEST:
+        start = time.perf_counter()
+        static_assets.load()
+        startup_timings["static_assets"] = round(time.perf_counter() - start, 3)
 
-app = FastAPI()
+    # Serve requests right away; /ready reports when the data is loaded
+    loader = asyncio.create_task(load_data_in_background())
+    if OPEN_BROWSER:
+        asyncio.get_running_loop().call_later(1.0, open_browser)
+    yield
+    loader.cancel()
+    shutdown_data()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow frontend + API to work together
 app.add_middleware(
@@ -23,13 +70,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount React static files
-app.mount("/static", StaticFiles(directory="frontend_build/static"), name="static")
+# Mount React static files (from disk only when the in-memory manifest is off)
+if not STATIC_MANIFEST:
+    app.mount("/static", StaticFiles(directory=os.path.join(STATIC_DIR, "static")), name="static")
+
+def _serve_static(relative_path: str, request: Request):
+    asset = static_assets.get(relative_path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return static_assets.respond(asset, request.headers)
 
 # Serve index.html from root "/"
 @app.get("/", response_class=HTMLResponse)
-async def serve_frontend():
-    return FileResponse("frontend_build/index.html")
+async def serve_frontend(request: Request):
+    if STATIC_MANIFEST:
+        return _serve_static(INDEX_FILE, request)
+    return FileResponse(os.path.join(STATIC_DIR, INDEX_FILE))
+
+# Readiness probe: 503 until the dataset is loaded
+@app.get("/ready")
+async def readiness():
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "startup_timings": startup_timings}
+    )
+
+# Cache and classifier counters
+@app.get("/stats")
+async def stats():
+    return {
+        "intent": intent_stats,
+        "schema_cache": schema_cache_stats,
+        "response_cache": response_cache.stats,
+        "compiled_code_cache": compile_stats,
+        "prompt_context": prompt_context_stats,
+        "charts": chart_store.stats,
+        "memory": memory_stats,
+        "sql_archive": archive_stats,
+        "static_assets": static_assets.stats
+    }
+
+# Per-stage latency, LLM and execution histograms (Prometheus text format; needs TRACING_ENABLED)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return render_metrics()
 
 # API endpoint
 class QueryRequest(BaseModel):
@@ -37,17 +122,104 @@ class QueryRequest(BaseModel):
 
 @app.post("/query")
 async def handle_query(req: QueryRequest):
-    return run_agent_pipeline(req.query)
+    if query_slots.locked():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queries in progress. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+    async with query_slots:
+        response = await run_agent_pipeline_async(req.query)
+    return Response(content=dumps(response), media_type="application/json")
+
+# Many questions in one request (e.g. a dashboard's canned questions); it takes one query
+# slot, plus one per further question in flight while slots are free
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=BATCH_MAX_QUERIES)
+
+@app.post("/query/batch")
+async def handle_query_batch(req: BatchQueryRequest):
+    if query_slots.locked():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queries in progress. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+    async with query_slots:
+        response = await run_agent_batch_async(req.queries, slots=query_slots)
+    return Response(content=dumps(response), media_type="application/json")
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+# Same pipeline as /query, streamed as Server-Sent Events:
+# status -> table -> chart -> summary (repeated, one text piece each) -> done
+@app.post("/query/stream")
+async def handle_query_stream(req: QueryRequest):
+    if query_slots.locked():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queries in progress. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+
+    async def event_stream():
+        async with query_slots:
+            async for event, data in run_agent_pipeline_stream(req.query):
+                yield _sse_event(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Further pages of a table result; the first page comes with the /query response
+# columnar: {"columns": [...], "data": [[column values], ...]}, records: [{column: value}, ...],
+# arrow: Arrow IPC stream of the page
+@app.get("/results/{result_id}")
+async def fetch_result_page(result_id: str, offset: int = 0, limit: int = TABLE_PAGE_SIZE, format: str = "columnar"):
+    if format not in ("columnar", "records", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be columnar, records or arrow")
+    table = table_store.get(result_id)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), TABLE_MAX_PAGE_SIZE)
+
+    page = table.page(offset, limit)
+    info = table_store.page_info(result_id, table, offset, limit)
+    if format == "arrow":
+        headers = {"X-Total-Rows": str(info["total_rows"])}
+        if info["next_offset"] is not None:
+            headers["X-Next-Offset"] = str(info["next_offset"])
+        return Response(content=to_arrow(page), media_type="application/vnd.apache.arrow.stream", headers=headers)
+    rows = to_columnar(page) if format == "columnar" else {"rows": to_records(page)}
+    return Response(content=dumps({**info, **rows}), media_type="application/json")
 
 # Chart image route (must be above catch-all)
 @app.get("/charts/{filename}")
-async def serve_chart(filename: str):
-    return FileResponse(path=os.path.join("charts", filename), media_type="image/png")
+async def serve_chart(filename: str, request: Request):
+    # Filenames are content hashes, so a chart never changes once served
+    headers = {"ETag": f'"{os.path.splitext(filename)[0]}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    data = chart_store.get(filename)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Chart not found")
+    return Response(content=data, media_type="image/png", headers=headers)
 
 # Catch-all fallback for React Router
 @app.get("/{full_path:path}", response_class=HTMLResponse)
-async def serve_react_router(full_path: str):
-    file_path = os.path.join("frontend_build", full_path)
+async def serve_react_router(full_path: str, request: Request):
+    if STATIC_MANIFEST:
+        # Build files by their path, missing /static assets 404, any other path is an app route
+        if static_assets.get(full_path) is not None or full_path.startswith("static/"):
+            return _serve_static(full_path, request)
+        return _serve_static(INDEX_FILE, request)
+
+    file_path = os.path.join(STATIC_DIR, full_path)
     if os.path.exists(file_path) and not os.path.isdir(file_path):
         return FileResponse(file_path)
-    return FileResponse("frontend_build/index.html")
\ No newline at end of file
+    return FileResponse(os.path.join(STATIC_DIR, INDEX_FILE))
\ No newline at end of file
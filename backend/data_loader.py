@@ -1,8 +1,11 @@
 import json
 import os
+import numpy as np
 import pandas as pd
 import re
-from sentence_transformers import SentenceTransformer, util
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
 # ------------------ Canonical Setup ------------------
 CANONICAL_FIELDS = ["co2", "temperature", "humidity", "timestamp"]
@@ -22,9 +25,38 @@ ABBREVIATIONS = {
     "time": "timestamp"
 }
 
-# Load model and encode canonical fields once
-model = SentenceTransformer("all-MiniLM-L6-v2")
-canonical_embeddings = model.encode(CANONICAL_FIELDS, convert_to_tensor=True)
+MODEL_NAME = "all-MiniLM-L6-v2"
+SCHEMA_CACHE_PATH = os.getenv(
+    "SCHEMA_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".schema_cache.json")
+)
+
+# Model and canonical embeddings are loaded once, at server startup or on first use (see get_model)
+_loaded_model = None  # (model, canonical embeddings)
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    Loads the SentenceTransformer model and encodes the canonical fields once; returns
+    (model, canonical embeddings). Safe to call from several threads at the same time.
+    """
+    global _loaded_model
+    loaded = _loaded_model
+    if loaded is None:
+        with _model_lock:
+            if _loaded_model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(MODEL_NAME)
+                # Published as one pair, so no reader sees the model without its embeddings
+                _loaded_model = (model, model.encode(CANONICAL_FIELDS, convert_to_tensor=True))
+            loaded = _loaded_model
+    return loaded
+
+# ------------------ Schema Resolution Cache ------------------
+# Preprocessed key -> canonical field (None means "keep the raw key"),
+# grouped per (model, threshold) so a config change never reuses stale matches.
+_schema_cache = None
+schema_cache_stats = {"hits": 0, "misses": 0}
 
 # ------------------ Normalization Helpers ------------------
 def preprocess_key(key):
@@ -37,33 +69,83 @@ def preprocess_key(key):
     )
     return ABBREVIATIONS.get(cleaned, cleaned)
 
-def normalize_fields_auto(entry, threshold=0.6):
+def _cache_section(threshold):
     """
-    Normalize fields using abbreviation mapping + fuzzy matching fallback
+    Returns the cached mappings for the current model and threshold, loading them from disk once.
+    """
+    global _schema_cache
+    if _schema_cache is None:
+        try:
+            with open(SCHEMA_CACHE_PATH, "r") as f:
+                _schema_cache = json.load(f)
+        except (OSError, ValueError):
+            _schema_cache = {}
+    return _schema_cache.setdefault(f"{MODEL_NAME}@{threshold}", {})
+
+def _save_schema_cache():
+    try:
+        tmp_path = f"{SCHEMA_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_schema_cache, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, SCHEMA_CACHE_PATH)
+    except OSError as e:
+        print(f"[⚠️] Failed to save schema cache: {e}")
+
+def resolve_field_names(raw_keys, threshold=0.6):
     """
-    normalized = {}
-    for raw_key, value in entry.items():
+    Maps each distinct raw key to its canonical field name.
+    Known keys come from the abbreviation table or the schema cache; all unknown keys
+    are embedded together in a single batch and the result is persisted for later runs.
+    """
+    cache = _cache_section(threshold)
+    mapping = {}
+    unknown = {}
+
+    for raw_key in dict.fromkeys(raw_keys):
         pre_key = preprocess_key(raw_key)
 
         # Step 1: Abbreviation match
         if pre_key in CANONICAL_FIELDS:
-            normalized[pre_key] = value
+            mapping[raw_key] = pre_key
+            schema_cache_stats["hits"] += 1
             continue
 
-        # Step 2: Fuzzy match
-        raw_embed = model.encode(pre_key, convert_to_tensor=True)
-        sim_scores = util.cos_sim(raw_embed, canonical_embeddings)[0]
-        best_idx = int(sim_scores.argmax())
-        best_score = float(sim_scores[best_idx])
+        # Step 2: Previously resolved key
+        if pre_key in cache:
+            mapping[raw_key] = cache[pre_key] or raw_key
+            schema_cache_stats["hits"] += 1
+            continue
 
-        if best_score >= threshold:
-            normalized_key = CANONICAL_FIELDS[best_idx]
-        else:
-            normalized_key = raw_key  # fallback to original
+        unknown.setdefault(pre_key, []).append(raw_key)
+
+    if unknown:
+        # Step 3: Fuzzy match every new key in one forward pass
+        pre_keys = list(unknown)
+        schema_cache_stats["misses"] += len(pre_keys)
+        from sentence_transformers import util
+        model, canonical_embeddings = get_model()
+        raw_embeds = model.encode(pre_keys, convert_to_tensor=True)
+        sim_scores = util.cos_sim(raw_embeds, canonical_embeddings)
 
-        normalized[normalized_key] = value
+        for row, pre_key in enumerate(pre_keys):
+            best_idx = int(sim_scores[row].argmax())
+            best_score = float(sim_scores[row][best_idx])
+            canonical = CANONICAL_FIELDS[best_idx] if best_score >= threshold else None
+            cache[pre_key] = canonical
+            for raw_key in unknown[pre_key]:
+                mapping[raw_key] = canonical or raw_key  # fallback to original
 
-    return normalized
+        _save_schema_cache()
+
+    return mapping
+
+def normalize_fields_auto(entry, threshold=0.6, field_map=None):
+    """
+    Normalize fields using abbreviation mapping + fuzzy matching fallback
+    """
+    if field_map is None:
+        field_map = resolve_field_names(entry.keys(), threshold)
+    return {field_map[raw_key]: value for raw_key, value in entry.items()}
 
 def clean_timestamps(df: pd.DataFrame) -> pd.DataFrame:
     if "timestamp" in df.columns:
@@ -76,24 +158,320 @@ def clean_timestamps(df: pd.DataFrame) -> pd.DataFrame:
             print(f"[⚠️] Failed to clean timestamps: {e}")
     return df
 
+# ------------------ Columnar Streaming ------------------
+CHUNK_SIZE = int(os.getenv("LOADER_CHUNK_SIZE", "50000"))  # NDJSON lines parsed per chunk
+NAT_EPOCH = np.iinfo("int64").min  # int64 value pandas reads back as NaT
+
+def _iter_chunks(lines_iter, chunk_size):
+    while True:
+        lines = list(islice(lines_iter, chunk_size))
+        if not lines:
+            return
+        yield [json.loads(line) for line in lines if line.strip()]
+
+def _to_column_array(name, values):
+    """
+    Converts one chunk of raw values into a typed numpy buffer.
+    Timestamps become int64 epoch nanoseconds (naive UTC), numbers become float/int arrays,
+    anything else stays as an object array.
+    """
+    if name == "timestamp":
+        raw = pd.Index(values, dtype=object)
+        try:
+            # ISO8601 accepts mixed precision ("...:00+00:00" next to "...:00.171539+00:00"),
+            # which format inference from the first row would turn into NaT
+            parsed = pd.to_datetime(raw, format="ISO8601", utc=True)
+        except (TypeError, ValueError):
+            parsed = None
+        try:
+            if parsed is None:
+                parsed = pd.to_datetime(raw, errors="coerce", utc=True)
+            return parsed.tz_convert(None).as_unit("ns").asi8
+        except Exception as e:
+            print(f"[⚠️] Failed to clean timestamps: {e}")
+            return np.asarray(values, dtype=object)
+
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        return np.asarray(values, dtype="int64")
+    if kinds and kinds <= {int, float, type(None)} and kinds != {type(None)}:
+        return np.asarray(values, dtype="float64")
+    return np.asarray(values, dtype=object)
+
+def _finish_column(name, segments):
+    """
+    Concatenates the chunk buffers of one column, filling chunks where it was absent.
+    Segments are arrays, or ints giving the length of a gap.
+    """
+    arrays = [seg for seg in segments if not isinstance(seg, int)]
+    if name == "timestamp" and all(arr.dtype == "int64" for arr in arrays):
+        filled = [np.full(seg, NAT_EPOCH, dtype="int64") if isinstance(seg, int) else seg for seg in segments]
+        return np.concatenate(filled).view("datetime64[ns]")
+
+    numeric = all(arr.dtype.kind in "if" for arr in arrays)
+    filled = []
+    for seg in segments:
+        if isinstance(seg, int):
+            seg = np.full(seg, np.nan, dtype="float64" if numeric else object)
+        filled.append(seg)
+    return np.concatenate(filled)
+
+def _complete_lines(f, position):
+    # Yields only newline-terminated lines so a half-written append is left for later
+    for line in f:
+        if not line.endswith(b"\n"):
+            return
+        position[0] += len(line)
+        yield line
+
+def read_room_file(path, start=0, complete_lines_only=False, chunk_size=CHUNK_SIZE):
+    """
+    Streams one NDJSON file from byte offset `start` into a normalized DataFrame.
+    Rows are parsed in fixed-size chunks and appended to typed column buffers, and
+    field names are resolved once per distinct header layout instead of once per row.
+    Returns the DataFrame and the byte offset where parsing stopped.
+    """
+    schemas = {}
+    segments = {}
+    total_rows = 0
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = [start]
+        lines_iter = _complete_lines(f, position) if complete_lines_only else f
+        for rows in _iter_chunks(lines_iter, chunk_size):
+            columns = {}
+            n = len(rows)
+            for i, entry in enumerate(rows):
+                keys = tuple(entry)
+                names = schemas.get(keys)
+                if names is None:
+                    field_map = resolve_field_names(keys)
+                    names = schemas[keys] = tuple(field_map[key] for key in keys)
+
+                for name, value in zip(names, entry.values()):
+                    column = columns.get(name)
+                    if column is None:
+                        column = columns[name] = [np.nan] * n
+                    column[i] = value
+
+            for name, values in columns.items():
+                if name not in segments:
+                    segments[name] = [total_rows] if total_rows else []
+                segments[name].append(_to_column_array(name, values))
+            for name, column_segments in segments.items():
+                if name not in columns:
+                    column_segments.append(n)
+            total_rows += n
+
+        end_offset = position[0] if complete_lines_only else f.tell()
+
+    data = {name: _finish_column(name, column_segments) for name, column_segments in segments.items()}
+    return pd.DataFrame(data, index=pd.RangeIndex(total_rows)), end_offset
+
+def load_room_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Streams one whole NDJSON file into a normalized DataFrame.
+    """
+    return read_room_file(path, chunk_size=chunk_size)[0]
+
 # ------------------ File Loading ------------------
-def load_all_rooms(directory="sensor-data"):
+LOADER_PARALLEL = os.getenv("LOADER_PARALLEL", "false").lower() == "true"
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "0")) or None  # None = one per CPU
+
+def room_name_from_file(file):
+    match = re.search(r'Room\s*\d+', file)
+    return match.group(0) if match else file.split('.')[0]
+
+def room_sort_key(room_name):
+    # Natural order so "Room 2" comes before "Room 10"
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', room_name)]
+
+def _load_room(path):
+    df, end_offset = read_room_file(path)
+    df['room'] = room_name_from_file(os.path.basename(path))
+    return df, end_offset
+
+def list_room_files(directory="sensor-data"):
+    """
+    Returns the NDJSON room files in the directory in natural room order.
+    """
+    files = sorted(
+        (file for file in os.listdir(directory) if file.endswith(".ndjson")),
+        key=lambda file: room_sort_key(room_name_from_file(file))
+    )
+    return [os.path.join(directory, file) for file in files]
+
+def load_rooms(paths, parallel=None, max_workers=None, offsets=None):
+    """
+    Loads the given room files, keyed by room name in the order given.
+    With parallel=True the files are spread over a process pool. A file that fails
+    to load is reported and skipped instead of aborting the whole load.
+    If an `offsets` dict is given, it is filled with the byte offset parsed up to per path.
+    """
+    if parallel is None:
+        parallel = LOADER_PARALLEL
+
+    loaded = {}
+    if parallel and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers or LOADER_WORKERS) as pool:
+            futures = {path: pool.submit(_load_room, path) for path in paths}
+            for path, future in futures.items():
+                try:
+                    loaded[path] = future.result()
+                except Exception as e:
+                    print(f"[⚠️] Failed to load {os.path.basename(path)}: {e}")
+    else:
+        for path in paths:
+            try:
+                loaded[path] = _load_room(path)
+            except Exception as e:
+                print(f"[⚠️] Failed to load {os.path.basename(path)}: {e}")
+
     room_dfs = {}
-    for file in os.listdir(directory):
-        if file.endswith(".ndjson"):
-            match = re.search(r'Room\s*\d+', file)
-            room_name = match.group(0) if match else file.split('.')[0]
-
-            with open(os.path.join(directory, file), 'r') as f:
-                lines = [json.loads(line) for line in f]
-
-            normalized = [normalize_fields_auto(entry) for entry in lines]
-            df = pd.DataFrame(normalized)
-            df = clean_timestamps(df)
-            df['room'] = room_name
-            room_dfs[room_name] = df
+    for path in paths:
+        if path in loaded:
+            df, end_offset = loaded[path]
+            room_dfs[room_name_from_file(os.path.basename(path))] = df
+            if offsets is not None:
+                offsets[path] = end_offset
     return room_dfs
 
-def load_combined_df(directory="sensor-data"):
-    room_dfs = load_all_rooms(directory)
-    return pd.concat(room_dfs.values(), ignore_index=True)
\ No newline at end of file
+def load_all_rooms(directory="sensor-data", parallel=None, max_workers=None, offsets=None):
+    return load_rooms(list_room_files(directory), parallel=parallel, max_workers=max_workers, offsets=offsets)
+
+def combine_rooms(frames, directory="sensor-data") -> pd.DataFrame:
+    """
+    Concatenates the loaded room frames into one compacted frame. Raises a RuntimeError
+    naming the directory when no room could be loaded (empty or all files unreadable).
+    """
+    frames = list(frames)
+    if not frames:
+        raise RuntimeError(f"No sensor data could be loaded from {directory}")
+    return compact_frame(pd.concat(frames, ignore_index=True), report=True)
+
+def load_combined_df(directory="sensor-data", parallel=None, max_workers=None, offsets=None):
+    room_dfs = load_all_rooms(directory, parallel=parallel, max_workers=max_workers, offsets=offsets)
+    return combine_rooms(room_dfs.values(), directory)
+
+# ------------------ Compact Dtypes ------------------
+# Sensor readings are stored as float32 and `room` as a categorical, and any extra
+# (unmapped) fields get the narrowest nullable dtype that holds them, instead of
+# float64 and per-row Python objects.
+COMPACT_DTYPES = os.getenv("COMPACT_DTYPES", "true").lower() == "true"
+SENSOR_FIELDS = [field for field in CANONICAL_FIELDS if field != "timestamp"]
+memory_stats = {}  # last load's report: column -> {dtype/bytes before and after}
+
+def _compact_extra(values: pd.Series) -> pd.Series:
+    if values.dtype == object:
+        non_null = values.dropna()
+        kinds = set(map(type, non_null))
+        if not kinds:
+            return values.astype("Float32")
+        if kinds == {bool}:
+            return values.astype("boolean")
+        if not kinds <= {int, float}:
+            return values  # text stays as is
+        values = pd.to_numeric(values)
+
+    if values.dtype.kind == "b":
+        return values
+    if values.dtype.kind in "iu":
+        return pd.to_numeric(values, downcast="integer")
+    if values.dtype.kind == "f":
+        non_null = values.dropna()
+        if len(non_null) and (non_null == np.round(non_null)).all() and non_null.abs().max() < 2 ** 53:
+            narrow = pd.to_numeric(non_null.astype("int64"), downcast="integer").dtype
+            return values.astype(str(narrow).capitalize())  # e.g. int16 -> Int16
+        return values.astype("Float32")
+    return values
+
+def _nullable_dtype(dtype):
+    # Same width, able to hold missing values (int16 -> Int16, bool -> boolean)
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        return pd.api.types.pandas_dtype(f"{'U' if dtype.kind == 'u' else ''}Int{dtype.itemsize * 8}")
+    if isinstance(dtype, np.dtype) and dtype.kind == "b":
+        return pd.BooleanDtype()
+    return dtype
+
+def _conform_column(values: pd.Series, dtype) -> pd.Series:
+    """
+    Casts a compacted column to the loaded frame's dtype when no value is lost, so appended
+    rows keep the frame's layout; otherwise keeps its own dtype and the concat widens.
+    """
+    if values.dtype == dtype or isinstance(dtype, pd.CategoricalDtype) or dtype == object:
+        return values
+    target = _nullable_dtype(dtype) if values.hasnans else dtype
+    non_null = values.dropna()
+    if dtype.kind == "b":
+        fits = pd.api.types.is_bool_dtype(non_null) or non_null.map(type).eq(bool).all()
+    elif dtype.kind in "iuf" and not pd.api.types.is_numeric_dtype(non_null):
+        fits = False
+    elif dtype.kind in "iu":
+        numbers = non_null.astype("float64")
+        info = np.iinfo(getattr(dtype, "numpy_dtype", dtype))
+        fits = bool((numbers == np.round(numbers)).all()) and (not len(numbers) or (
+            numbers.min() >= info.min and numbers.max() <= info.max
+        ))
+    else:
+        fits = dtype.kind in "fM"
+    if not fits:
+        return values
+    try:
+        return values.astype(target)
+    except (TypeError, ValueError):
+        return values
+
+def compact_frame(df: pd.DataFrame, report: bool = False, like: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Returns the frame with the compact column layout. With report=True, prints and keeps
+    (in memory_stats) the bytes per column before and after.
+    Rows to be appended pass the loaded frame as `like`: its columns keep their dtypes
+    (nullable where these rows lack a value or the column) instead of being inferred again.
+    """
+    if not COMPACT_DTYPES or df is None:
+        return df
+    before = df.memory_usage(deep=True, index=False) if report else None
+
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if name in SENSOR_FIELDS:
+            columns[name] = pd.to_numeric(values, errors="coerce").astype("float32")
+        elif name == "room":
+            columns[name] = values.astype("category")
+        elif name == "timestamp":
+            columns[name] = values
+        else:
+            columns[name] = _compact_extra(values)
+    if like is not None:
+        for name, dtype in like.dtypes.items():
+            if name in columns:
+                columns[name] = _conform_column(columns[name], dtype)
+            elif not isinstance(dtype, pd.CategoricalDtype):
+                columns[name] = pd.Series(None, index=df.index, dtype=_nullable_dtype(dtype))
+        columns = {name: columns[name] for name in [*like.columns, *df.columns] if name in columns}
+    compacted = pd.DataFrame(columns, index=df.index)
+
+    if report:
+        after = compacted.memory_usage(deep=True, index=False)
+        memory_stats.clear()
+        memory_stats.update({
+            name: {
+                "dtype_before": str(df[name].dtype), "bytes_before": int(before[name]),
+                "dtype_after": str(compacted[name].dtype), "bytes_after": int(after[name]),
+            }
+            for name in df.columns
+        })
+        print_memory_report()
+    return compacted
+
+def print_memory_report():
+    before = sum(entry["bytes_before"] for entry in memory_stats.values())
+    after = sum(entry["bytes_after"] for entry in memory_stats.values())
+    print(f"🧮 Memory: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    for name, entry in memory_stats.items():
+        print(
+            f"   {name}: {entry['dtype_before']} {entry['bytes_before'] / 1e6:.2f} MB -> "
+            f"{entry['dtype_after']} {entry['bytes_after'] / 1e6:.2f} MB"
+        )
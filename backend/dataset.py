@@ -0,0 +1,104 @@
+import threading
+import pandas as pd
+
+# ------------------ Shared Dataset State ------------------
+# The combined frame, its version and the data derived from it (rollups, indexes)
+# are swapped together as one tuple, so a reader always sees a matching set and keeps
+# a consistent view for the whole query even while new readings are being appended.
+_state = (None, 0, {})
+_write_lock = threading.Lock()
+_listeners = []
+_derived_builders = {}
+_frame_layout = None
+
+def get_state():
+    """
+    Returns the current (DataFrame, version, derived) triple. Never mutate what it returns.
+    """
+    return _state
+
+def get_dataset():
+    """
+    Returns the current (DataFrame, version) pair. Never mutate the returned frame.
+    """
+    return _state[0], _state[1]
+
+def get_full_df() -> pd.DataFrame:
+    return _state[0]
+
+def on_dataset_change(callback):
+    """
+    Registers callback(df, version), called after every swap (e.g. to invalidate caches).
+    """
+    _listeners.append(callback)
+
+def register_derived(name, build, update=None):
+    """
+    Registers data derived from the frame. build(df) computes it from scratch;
+    update(previous, new_rows, df) refreshes it after an append. Both run under the
+    write lock, before the swap, so derived data always matches the frame it ships with.
+    """
+    _derived_builders[name] = (build, update)
+
+def register_frame_layout(prepare, append):
+    """
+    Registers how frames are laid out (e.g. sorted for the time index). prepare(df) is
+    applied to every new dataset and append(df, new_rows) replaces the plain concat.
+    """
+    global _frame_layout
+    _frame_layout = (prepare, append)
+
+def _derive(df, previous=None, new_rows=None):
+    derived = {}
+    for name, (build, update) in _derived_builders.items():
+        try:
+            if previous is not None and update is not None and name in previous:
+                derived[name] = update(previous[name], new_rows, df)
+            else:
+                derived[name] = build(df)
+        except Exception as e:
+            print(f"[⚠️] Failed to build {name}: {e}")
+    return derived
+
+def set_dataset(df: pd.DataFrame) -> int:
+    """
+    Replaces the whole dataset and returns the new version.
+    """
+    global _state
+    with _write_lock:
+        if _frame_layout is not None and df is not None:
+            df = _frame_layout[0](df)
+        _state = (df, _state[1] + 1, _derive(df))
+        current = _state
+    _notify(current)
+    return current[1]
+
+def append_rows(new_rows: pd.DataFrame) -> int:
+    """
+    Appends new readings by building a new frame and swapping it in.
+    Queries already holding the previous frame are unaffected.
+    """
+    global _state
+    with _write_lock:
+        df, version, derived = _state
+        new_rows = new_rows.reset_index(drop=True)
+        if df is None:
+            combined = _frame_layout[0](new_rows) if _frame_layout is not None else new_rows
+            derived = _derive(combined)
+        else:
+            if _frame_layout is not None:
+                combined = _frame_layout[1](df, new_rows)
+            else:
+                combined = pd.concat([df, new_rows], ignore_index=True)
+            derived = _derive(combined, derived, new_rows)
+        _state = (combined, version + 1, derived)
+        current = _state
+    _notify(current)
+    return current[1]
+
+def _notify(state):
+    for callback in _listeners:
+        try:
+            callback(state[0], state[1])
+        except Exception as e:
+            print(f"[⚠️] Dataset listener failed: {e}")
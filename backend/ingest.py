@@ -0,0 +1,82 @@
+import os
+import threading
+import pandas as pd
+from data_loader import list_room_files, read_room_file, room_name_from_file, compact_frame
+from dataset import append_rows, get_full_df
+
+INGEST_INTERVAL = float(os.getenv("INGEST_INTERVAL", "5"))  # seconds between polls
+
+# ------------------ TailIngestor ------------------
+class TailIngestor:
+    """
+    Follows append-only room files and adds newly written readings to the shared dataset.
+    Tracks the byte offset parsed so far per file and only parses complete lines beyond it.
+    New rows go to `sink` (the in-memory dataset by default), with the column dtypes of the
+    frame `layout()` returns (None: inferred from the new rows alone).
+    """
+
+    def __init__(self, directory, offsets=None, interval=INGEST_INTERVAL, sink=append_rows, layout=get_full_df):
+        self.directory = directory
+        self.offsets = dict(offsets or {})
+        self.interval = interval
+        self.sink = sink
+        self.layout = layout
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self) -> int:
+        """
+        Parses everything appended since the last poll and returns the number of new rows.
+        Offsets only move forward once the rows reached the sink, so a failed poll is retried.
+        """
+        new_frames = []
+        parsed_offsets = {}
+        for path in list_room_files(self.directory):
+            offset = self.offsets.get(path, 0)
+            try:
+                size = os.path.getsize(path)
+                if size < offset:
+                    print(f"[⚠️] {os.path.basename(path)} shrank; append-only files expected, skipping")
+                    continue
+                if size == offset:
+                    continue
+                df, end_offset = read_room_file(path, start=offset, complete_lines_only=True)
+            except Exception as e:
+                print(f"[⚠️] Failed to ingest {os.path.basename(path)}: {e}")
+                continue
+
+            parsed_offsets[path] = end_offset
+            if len(df):
+                df['room'] = room_name_from_file(os.path.basename(path))
+                new_frames.append(df)
+
+        if not new_frames:
+            self.offsets.update(parsed_offsets)
+            return 0
+        # Cast to the loaded frame's dtypes, so appending only widens a column for values it can't hold
+        layout = self.layout() if self.layout is not None else None
+        new_rows = compact_frame(pd.concat(new_frames, ignore_index=True), like=layout)
+        self.sink(new_rows)
+        self.offsets.update(parsed_offsets)
+        return len(new_rows)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                added = self.poll_once()
+                if added:
+                    print(f"📥 Ingested {added} new readings")
+            except Exception as e:
+                print(f"[⚠️] Ingest poll failed, retrying next poll: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tail-ingest", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -1,34 +1,412 @@
+import asyncio
 import os
-from ai_agent.generate_code import generate_code_from_query
-from ai_agent.code_executor import run_generated_code
-from data_loader import load_combined_df
-from ai_agent.response_formatter import create_response_package
+import threading
+import time
+from ai_agent.generate_code import generate_code_from_query, generate_code_from_query_async
+from ai_agent.code_executor import run_generated_code, warm_up_pool, shutdown_pool
+from ai_agent.worker_pool import run_blocking
+from snapshot_store import load_snapshot_df
+from sql_store import SQL_BACKEND, open_archive
+from dataset import set_dataset, get_state, get_full_df, on_dataset_change, register_derived, register_frame_layout
+from rollups import ROLLUPS_ENABLED, build_rollups, update_rollups, describe_rollups
+from time_index import TIME_INDEX_ENABLED, prepare_frame, append_frame, build_room_index, describe_time_index
+from ingest import TailIngestor
+from ai_agent.response_formatter import create_response_package, create_response_package_async, format_table, save_chart
+from ai_agent.summarize_result import stream_result_explanation
+from ai_agent.chart_store import chart_store
+from ai_agent.tracing import request_trace, stage
+from ai_agent.response_cache import response_cache, cached_response, normalize_question, RESPONSE_CACHE_ENABLED
+from ai_agent.query_understanding import is_visual_query_batch_async, warm_up_embeddings, INTENT_EMBEDDINGS
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-# Load full DataFrame globally
-DATA_DIR = "/Users/thathsarani/Desktop/Eutech Assignment/data_analysis_agent/sensor-data"
-full_df = load_combined_df(DATA_DIR)
+# Data is loaded by init_data() at server startup, not at import
+DATA_DIR = os.getenv("DATA_DIR", "/Users/thathsarani/Desktop/Eutech Assignment/data_analysis_agent/sensor-data")
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "false").lower() == "true"
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # questions of one batch in flight
+
+ingestor = None
+startup_timings = {}
+
+# Cached answers are only valid for the data they were computed on
+on_dataset_change(response_cache.clear)
+
+# Hourly/daily rollups are kept in step with the frame and exposed to generated code
+# (in SQL mode there is no in-memory frame; DuckDB aggregates the archive directly)
+if ROLLUPS_ENABLED and not SQL_BACKEND:
+    register_derived("rollups", build_rollups, update_rollups)
+
+# Frame kept sorted by (room, timestamp) so range filters are binary searches
+if TIME_INDEX_ENABLED and not SQL_BACKEND:
+    register_frame_layout(prepare_frame, append_frame)
+    register_derived("room_index", build_room_index)
+
+def init_data():
+    """
+    Loads the combined DataFrame (from the snapshot when possible) and starts tail ingest.
+    In SQL mode the Parquet archive is synced and opened instead.
+    Called once from the API server's startup hook; records how long each step took.
+    """
+    global ingestor
+    # The embedding model loads alongside the data and is ready before the first query
+    model_loader = _start_model_warm_up()
+    if SQL_BACKEND:
+        _init_archive()
+        model_loader.join()
+        return
+
+    start = time.perf_counter()
+    source_offsets = {}
+    full_df = load_snapshot_df(DATA_DIR, offsets=source_offsets)
+    startup_timings["load_data"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    set_dataset(full_df)
+    startup_timings["derived_data"] = round(time.perf_counter() - start, 3)
+
+    # Start executor workers (pool mode) so the first query doesn't pay for them
+    start = time.perf_counter()
+    full_df, _, derived = get_state()
+    warm_up_pool(full_df, _extra_frames(derived))
+    startup_timings["executor_warm_up"] = round(time.perf_counter() - start, 3)
+
+    # Follow appended readings without a restart
+    if INGEST_ENABLED:
+        ingestor = TailIngestor(DATA_DIR, source_offsets).start()
+
+    # Keep the chart directory within its size/age bounds
+    chart_store.start()
+    model_loader.join()
+
+def _start_model_warm_up() -> threading.Thread:
+    def load():
+        if not (INTENT_EMBEDDINGS or RESPONSE_CACHE_ENABLED):
+            return
+        start = time.perf_counter()
+        try:
+            warm_up_embeddings()
+        except Exception as e:
+            print(f"[⚠️] Failed to load the embedding model: {e}")
+        startup_timings["embedding_model"] = round(time.perf_counter() - start, 3)
+
+    loader = threading.Thread(target=load, name="model-warm-up", daemon=True)
+    loader.start()
+    return loader
+
+def _init_archive():
+    # SQL mode: the dataset is the archive itself; each append bumps its version
+    global ingestor
+    start = time.perf_counter()
+    source_offsets = {}
+    archive = open_archive(DATA_DIR, offsets=source_offsets)
+    set_dataset(archive)
+    startup_timings["load_data"] = round(time.perf_counter() - start, 3)
+
+    def append_to_archive(new_rows):
+        archive.append(new_rows)
+        set_dataset(archive)
+
+    if INGEST_ENABLED:
+        ingestor = TailIngestor(DATA_DIR, source_offsets, sink=append_to_archive, layout=None).start()
+    chart_store.start()
+
+def shutdown_data():
+    if ingestor is not None:
+        ingestor.stop()
+    chart_store.stop()
+    shutdown_pool()
+
+def is_ready() -> bool:
+    return get_full_df() is not None
+
+def _not_ready_response() -> dict:
+    return {
+        "summary": "The sensor data is still loading. Please try again in a moment.",
+        "table": [],
+        "table_info": None,
+        "chart_path": None
+    }
+
+def _error_response(e: Exception) -> dict:
+    import traceback
+    traceback.print_exc()
+    return {
+        "summary": f"Error: {str(e)}",
+        "table": [],
+        "table_info": None,
+        "chart_path": None
+    }
+
+def _extra_frames(derived: dict) -> dict:
+    # Named frames available to generated code next to `df`
+    frames = dict(derived.get("rollups", {}))
+    if "room_index" in derived:
+        frames["room_index"] = derived["room_index"]
+    return frames
+
+def _prompt_context(derived: dict) -> str:
+    # Extra prompt text describing the frames and helpers from _extra_frames
+    return describe_rollups(derived.get("rollups")) + describe_time_index(derived.get("room_index"))
+
+def _is_error_result(result_obj) -> bool:
+    return isinstance(result_obj, str) and result_obj.startswith("Error executing code")
+
+def _cache_lookup(user_q: str, version: int):
+    if not RESPONSE_CACHE_ENABLED:
+        return None, None
+    with stage("cache_lookup"):
+        return response_cache.lookup(user_q, version)
+
+def _with_timings(response: dict, trace) -> dict:
+    # Per-request timing block; added to a copy so cached responses stay clean
+    if trace is None:
+        return response
+    return dict(response, timings=trace.as_dict())
 
 def run_agent_pipeline(user_q: str) -> dict:
+    with request_trace() as trace:
+        return _with_timings(_run_agent_pipeline(user_q), trace)
+
+async def run_agent_pipeline_async(user_q: str) -> dict:
+    """
+    Non-blocking pipeline for the API server: LLM calls are awaited on the async client
+    and code execution / chart rendering run on the bounded execution pool.
+    """
+    with request_trace() as trace:
+        return _with_timings(await _run_agent_pipeline_async(user_q), trace)
+
+async def run_agent_pipeline_stream(user_q: str):
+    """
+    Streaming pipeline: yields (event, data) pairs as each stage finishes -
+    status updates, then the table, then the chart path, then the summary in pieces,
+    and finally "done" with the same response /query would return.
+    """
+    with request_trace() as trace:
+        async for event, data in _run_agent_pipeline_stream(user_q):
+            yield event, (_with_timings(data, trace) if event == "done" else data)
+
+async def run_agent_batch_async(questions: list, slots: asyncio.Semaphore = None) -> dict:
+    """
+    Answers many questions against one snapshot of the data. Identical questions are
+    answered once, chart intent for all of them is decided together (one LLM call for
+    the unclear ones), and code generation, execution and summaries run with at most
+    BATCH_CONCURRENCY questions in flight. Returns {"results": [...]} in question order;
+    a failing question gets status "error" without affecting the others.
+    If `slots` (the server's query slots) is given, the caller holds one of them for the
+    batch and each further question in flight takes another while one is free.
+    """
+    with request_trace() as trace:
+        return _with_timings({"results": await _run_agent_batch_async(questions, slots)}, trace)
+
+async def _run_agent_batch_async(questions: list, slots: asyncio.Semaphore = None) -> list:
+    state = get_state()
+    full_df, version, _ = state
+    if full_df is None:
+        return [dict(_not_ready_response(), query=question, status="error") for question in questions]
+
+    # One entry per distinct question (after normalization), in first-seen order
+    first_text = {}
+    for question in questions:
+        first_text.setdefault(normalize_question(question), question)
+    unique, texts = list(first_text), list(first_text.values())
+
+    lookups = await asyncio.gather(*(_batch_cache_lookup(text, version) for text in texts))
+    to_classify = [i for i, (cached, _) in enumerate(lookups) if cached is None]
+    intents = [None] * len(texts)
+    if to_classify:
+        # A failed shared call (rate limit, timeout) leaves the intents unset; each
+        # question then classifies itself while it is being answered
+        try:
+            with stage("classify_intent", cpu=False):
+                answers = await is_visual_query_batch_async([texts[i] for i in to_classify])
+            for i, answer in zip(to_classify, answers):
+                intents[i] = answer
+        except Exception as e:
+            print(f"[⚠️] Batch intent check failed: {e}")
+
+    results = [None] * len(texts)
+    next_index = 0
+    running = 0
+    workers = []
+
+    async def answer(i):
+        try:
+            cached, cache_key = lookups[i]
+            response, ok = await _answer_async(texts[i], state, cached, cache_key, intents[i])
+            return dict(response, status="ok" if ok else "error")
+        except Exception as e:
+            return dict(_error_response(e), status="error")
+
+    async def work(extra_slot: bool):
+        # Answers questions one after another until none are left
+        nonlocal next_index, running
+        try:
+            while next_index < len(texts):
+                i, next_index = next_index, next_index + 1
+                results[i] = await answer(i)
+                await widen()
+        finally:
+            running -= 1
+            if extra_slot:
+                slots.release()
+
+    async def widen():
+        # One more question in flight per free query slot, up to BATCH_CONCURRENCY;
+        # never waits for a slot, so batches can't deadlock holding theirs
+        nonlocal running
+        while running < BATCH_CONCURRENCY and next_index + running < len(texts):
+            if slots is not None:
+                if slots.locked():
+                    return
+                await slots.acquire()  # free, so this returns right away
+            running += 1
+            workers.append(asyncio.ensure_future(work(slots is not None)))
+
+    # The first worker runs on the slot the caller holds for the whole batch
+    running = 1
+    workers.append(asyncio.ensure_future(work(False)))
+    await widen()
+    position = 0
+    while position < len(workers):  # workers started later are appended while waiting
+        await workers[position]
+        position += 1
+
+    answered = dict(zip(unique, results))
+    return [dict(answered[normalize_question(question)], query=question) for question in questions]
+
+async def _batch_cache_lookup(user_q: str, version: int):
+    # A failed lookup only means that question is answered (and not cached) as new
+    try:
+        return await run_blocking(_cache_lookup, user_q, version)
+    except Exception as e:
+        print(f"[⚠️] Cache lookup failed: {e}")
+        return None, None
+
+def _run_agent_pipeline(user_q: str) -> dict:
+    # Take one consistent view of the data for the whole query
+    full_df, version, derived = get_state()
+    if full_df is None:
+        return _not_ready_response()
     try:
+        # Reuse the answer or generated code of an equivalent earlier question
+        cached, cache_key = _cache_lookup(user_q, version)
+        if cached is not None and cached["response"] is not None:
+            return cached_response(cached)
+
         # Generate code and detect if plot needed
-        code, should_plot_flag = generate_code_from_query(user_q, full_df)
-        print("✅ Generated code:\n", code)
+        if cached is not None:
+            code, should_plot_flag = cached["code"], cached["needs_plot"]
+        else:
+            code, should_plot_flag = generate_code_from_query(user_q, full_df, _prompt_context(derived), version)
+            print("✅ Generated code:\n", code)
         
         # Execute generated code
-        result_obj, table_obj = run_generated_code(code, full_df, should_plot_flag)
+        result_obj, table_obj = run_generated_code(code, full_df, should_plot_flag, _extra_frames(derived))
 
         # Generate final summary + assets
         response = create_response_package(user_q, result_obj, should_plot_flag, table_obj)
 
+        if cache_key is not None and not _is_error_result(result_obj):
+            response_cache.store(cache_key, version, code, should_plot_flag, response)
+
         return response
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return {
-            "summary": f"Error: {str(e)}",
-            "table": [],
-            "chart_path": None
+        return _error_response(e)
+
+async def _run_agent_pipeline_async(user_q: str) -> dict:
+    full_df, version, derived = get_state()
+    if full_df is None:
+        return _not_ready_response()
+    try:
+        cached, cache_key = await run_blocking(_cache_lookup, user_q, version)
+        return (await _answer_async(user_q, (full_df, version, derived), cached, cache_key))[0]
+
+    except Exception as e:
+        return _error_response(e)
+
+async def _answer_async(user_q: str, state: tuple, cached, cache_key, needs_plot: bool = None):
+    # Generate (or reuse) code, run it on the given dataset state and package the answer.
+    # Returns (response, ok); ok is False when the generated code failed.
+    full_df, version, derived = state
+    if cached is not None and cached["response"] is not None:
+        return cached_response(cached), True
+
+    if cached is not None:
+        code, should_plot_flag = cached["code"], cached["needs_plot"]
+    else:
+        code, should_plot_flag = await generate_code_from_query_async(
+            user_q, full_df, _prompt_context(derived), version, needs_plot
+        )
+        print("✅ Generated code:\n", code)
+
+    result_obj, table_obj = await run_blocking(
+        run_generated_code, code, full_df, should_plot_flag, _extra_frames(derived)
+    )
+
+    response = await create_response_package_async(user_q, result_obj, should_plot_flag, table_obj)
+
+    failed = _is_error_result(result_obj)
+    if cache_key is not None and not failed:
+        response_cache.store(cache_key, version, code, should_plot_flag, response)
+
+    return response, not failed
+
+async def _run_agent_pipeline_stream(user_q: str):
+    full_df, version, derived = get_state()
+    if full_df is None:
+        yield "done", _not_ready_response()
+        return
+    try:
+        cached, cache_key = await run_blocking(_cache_lookup, user_q, version)
+        if cached is not None and cached["response"] is not None:
+            response = cached_response(cached)
+            yield "table", {"table": response["table"], "table_info": response.get("table_info")}
+            yield "chart", {"chart_path": response["chart_path"]}
+            yield "summary", {"delta": response["summary"]}
+            yield "done", response
+            return
+
+        if cached is not None:
+            code, should_plot_flag = cached["code"], cached["needs_plot"]
+        else:
+            yield "status", {"stage": "generating_code"}
+            code, should_plot_flag = await generate_code_from_query_async(
+                user_q, full_df, _prompt_context(derived), version
+            )
+            print("✅ Generated code:\n", code)
+
+        yield "status", {"stage": "executing"}
+        result_obj, table_obj = await run_blocking(
+            run_generated_code, code, full_df, should_plot_flag, _extra_frames(derived)
+        )
+
+        # Table and chart are prepared side by side; the table usually lands first
+        table_task = asyncio.ensure_future(run_blocking(format_table, result_obj, should_plot_flag, table_obj))
+        chart_task = asyncio.ensure_future(run_blocking(save_chart, result_obj, should_plot_flag))
+        try:
+            table_assets = await table_task
+            yield "table", table_assets
+            chart_path = await chart_task
+            yield "chart", {"chart_path": chart_path}
+        finally:
+            chart_task.cancel()
+
+        explanation_input = table_obj if table_obj is not None else result_obj
+        pieces = []
+        async for delta in stream_result_explanation(user_q, explanation_input):
+            pieces.append(delta)
+            yield "summary", {"delta": delta}
+
+        response = {
+            "summary": "".join(pieces).strip(),
+            **table_assets,
+            "chart_path": chart_path
         }
+        if cache_key is not None and not _is_error_result(result_obj):
+            response_cache.store(cache_key, version, code, should_plot_flag, response)
+
+        yield "done", response
+
+    except Exception as e:
+        yield "done", _error_response(e)
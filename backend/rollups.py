@@ -0,0 +1,103 @@
+import os
+import pandas as pd
+from time_index import TIME_INDEX_ENABLED, rows_since
+
+# ------------------ Rollup Setup ------------------
+# Hourly and daily aggregates per room, built when the data is loaded and refreshed
+# incrementally on append. Generated code can answer most time-bucket questions from
+# these few thousand rows instead of scanning every raw reading.
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+ROLLUP_STATS = ["count", "sum", "mean", "min", "max", "p50", "p95"]
+
+def metric_columns(df: pd.DataFrame) -> list:
+    return [
+        col for col in df.columns
+        if col not in ("timestamp", "room") and pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_bool_dtype(df[col])
+    ]
+
+def _aggregate(df: pd.DataFrame, bucket_name: str, freq: str, metrics: list) -> pd.DataFrame:
+    keys = [df["room"], df["timestamp"].dt.floor(freq).rename(bucket_name)]
+    grouped = df.groupby(keys, observed=True, sort=True)[metrics]
+
+    parts = {
+        "count": grouped.count(),
+        "sum": grouped.sum(),
+        "mean": grouped.mean(),
+        "min": grouped.min(),
+        "max": grouped.max(),
+        "p50": grouped.quantile(0.5),
+        "p95": grouped.quantile(0.95),
+    }
+    columns = {
+        f"{metric}_{stat}": parts[stat][metric]
+        for metric in metrics for stat in ROLLUP_STATS
+    }
+    return pd.DataFrame(columns).reset_index()
+
+def build_rollups(df: pd.DataFrame) -> dict:
+    """
+    Returns {"df_hourly": ..., "df_daily": ...} with count/sum/mean/min/max/p50/p95
+    per room, time bucket and metric.
+    """
+    metrics = metric_columns(df)
+    return {
+        "df_hourly": _aggregate(df, "hour", "h", metrics),
+        "df_daily": _aggregate(df, "date", "D", metrics),
+    }
+
+def _replace_buckets(previous: pd.DataFrame, fresh: pd.DataFrame, bucket_name: str, rooms, start, categories=None) -> pd.DataFrame:
+    keep = ~(previous["room"].isin(rooms) & (previous[bucket_name] >= start))
+    merged = pd.concat([previous[keep], fresh], ignore_index=True)
+    # A metric first seen in this batch has no values in the untouched buckets; a full
+    # rebuild counts (and sums) those as 0, so do the same instead of leaving NaN
+    for column in fresh.columns.difference(previous.columns):
+        if column.endswith("_count"):
+            merged[column] = merged[column].fillna(0).astype("int64")
+        elif column.endswith("_sum"):
+            merged[column] = merged[column].fillna(0.0)
+    if categories is not None:
+        # A new room widens the categories and concat falls back to object; keep room order
+        merged["room"] = pd.Categorical(merged["room"], categories=categories)
+    return merged.sort_values(["room", bucket_name], kind="stable").reset_index(drop=True)
+
+def update_rollups(previous: dict, new_rows: pd.DataFrame, df: pd.DataFrame) -> dict:
+    """
+    Recomputes only the buckets touched by the appended rows: every day (and its hours)
+    from the earliest new reading onwards, for the rooms that received readings.
+    """
+    new_rows = new_rows.dropna(subset=["timestamp"])
+    if new_rows.empty:
+        return previous
+
+    start = new_rows["timestamp"].min().floor("D")
+    rooms = new_rows["room"].unique()
+    if TIME_INDEX_ENABLED and isinstance(df["room"].dtype, pd.CategoricalDtype):
+        # Sorted by (room, timestamp): slice each room's block instead of masking every row
+        affected = rows_since(df, rooms, start)
+    else:
+        affected = df[(df["timestamp"] >= start) & df["room"].isin(rooms)]
+    fresh = build_rollups(affected)
+    categories = df["room"].cat.categories if isinstance(df["room"].dtype, pd.CategoricalDtype) else None
+
+    return {
+        "df_hourly": _replace_buckets(previous["df_hourly"], fresh["df_hourly"], "hour", rooms, start, categories),
+        "df_daily": _replace_buckets(previous["df_daily"], fresh["df_daily"], "date", rooms, start, categories),
+    }
+
+def describe_rollups(rollups: dict) -> str:
+    """
+    Prompt text describing the rollup frames available to generated code.
+    """
+    if not rollups:
+        return ""
+    hourly = rollups["df_hourly"]
+    metrics = [col[:-len("_mean")] for col in hourly.columns if col.endswith("_mean")]
+    example = metrics[0] if metrics else "co2"
+    return f"""
+Pre-aggregated DataFrames (much faster than scanning `df`; prefer them when they can answer the question):
+- `df_hourly`: one row per room and hour ({len(hourly)} rows). Columns: room, hour (datetime floored to the hour), then for each metric in [{', '.join(metrics)}]: <metric>_count, <metric>_sum, <metric>_mean, <metric>_min, <metric>_max, <metric>_p50, <metric>_p95.
+- `df_daily`: same columns per room and day ({len(rollups['df_daily'])} rows), with `date` (datetime at midnight) instead of `hour`.
+- To average over several buckets, divide sums by counts (e.g. df_daily.groupby('room')['{example}_sum'].sum() / df_daily.groupby('room')['{example}_count'].sum()); do not average the means.
+- Use `df` only for questions that need individual readings or percentiles across buckets.
+"""
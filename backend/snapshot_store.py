@@ -0,0 +1,133 @@
+import json
+import os
+import re
+from data_loader import MODEL_NAME, list_room_files, load_rooms, load_combined_df, room_name_from_file, combine_rooms
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # snapshots are an optimization; fall back to parsing NDJSON
+    pa = None
+    pq = None
+
+# ------------------ Snapshot Setup ------------------
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshot")
+)
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"
+MANIFEST_FILE = "manifest.json"
+# Bump when the normalized frame layout changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 1
+
+def source_signature(path):
+    """
+    Size and mtime of a source file; a room snapshot is valid only while these match.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _snapshot_file(room_name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', room_name) + ".parquet"
+
+def _read_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("model") != MODEL_NAME:
+        return {}
+    return manifest.get("files", {})
+
+def _write_manifest(snapshot_dir, files):
+    tmp_path = os.path.join(snapshot_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"format": SNAPSHOT_FORMAT, "model": MODEL_NAME, "files": files}, f, indent=2)
+    os.replace(tmp_path, os.path.join(snapshot_dir, MANIFEST_FILE))
+
+def read_room_snapshot(path):
+    """
+    Reads one room snapshot through a memory map instead of parsing it into Python objects.
+    """
+    return pq.read_table(path, memory_map=True).to_pandas()
+
+# ------------------ Snapshot Loading ------------------
+def load_snapshot_df(directory="sensor-data", snapshot_dir=SNAPSHOT_DIR, parallel=None, max_workers=None, offsets=None):
+    """
+    Returns the combined DataFrame, reusing the per-room Parquet snapshot for every source
+    file whose size and mtime are unchanged. Only new or modified rooms are parsed and
+    normalized again; their snapshots are then rewritten.
+    If an `offsets` dict is given, it is filled with the byte offset covered per source path.
+    """
+    if not SNAPSHOT_ENABLED or pq is None:
+        return load_combined_df(directory, parallel=parallel, max_workers=max_workers, offsets=offsets)
+
+    if offsets is None:
+        offsets = {}
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = _read_manifest(snapshot_dir)
+    paths = list_room_files(directory)
+
+    room_dfs = {}
+    files = {}
+    signatures = {}
+    stale_paths = []
+    for path in paths:
+        file = os.path.basename(path)
+        signature = signatures[path] = source_signature(path)
+        entry = manifest.get(file)
+        if entry and entry["size"] == signature["size"] and entry["mtime_ns"] == signature["mtime_ns"]:
+            try:
+                room_dfs[path] = read_room_snapshot(os.path.join(snapshot_dir, entry["snapshot"]))
+                files[file] = entry
+                offsets[path] = entry["size"]
+                continue
+            except Exception as e:
+                print(f"[⚠️] Failed to read snapshot for {file}: {e}")
+        stale_paths.append(path)
+
+    if stale_paths:
+        rebuilt = load_rooms(stale_paths, parallel=parallel, max_workers=max_workers, offsets=offsets)
+        for path in stale_paths:
+            file = os.path.basename(path)
+            room_name = room_name_from_file(file)
+            if room_name not in rebuilt:
+                continue
+            df = rebuilt[room_name]
+            room_dfs[path] = df
+            try:
+                snapshot = _snapshot_file(room_name)
+                pq.write_table(
+                    pa.Table.from_pandas(df, preserve_index=False),
+                    os.path.join(snapshot_dir, snapshot)
+                )
+                # Record the bytes actually parsed: if the file grew while loading,
+                # the size no longer matches and the room is rebuilt next time
+                files[file] = {
+                    "room": room_name,
+                    "snapshot": snapshot,
+                    "size": offsets[path],
+                    "mtime_ns": signatures[path]["mtime_ns"]
+                }
+            except Exception as e:
+                print(f"[⚠️] Failed to write snapshot for {file}: {e}")
+
+    # Drop snapshots whose source file disappeared
+    live_snapshots = {entry["snapshot"] for entry in files.values()}
+    for file, entry in manifest.items():
+        if file not in files and entry["snapshot"] not in live_snapshots:
+            try:
+                os.remove(os.path.join(snapshot_dir, entry["snapshot"]))
+            except OSError:
+                pass
+
+    try:
+        _write_manifest(snapshot_dir, files)
+    except OSError as e:
+        print(f"[⚠️] Failed to write snapshot manifest: {e}")
+
+    print(f"📦 Snapshot: reused {len(paths) - len(stale_paths)} rooms, rebuilt {len(stale_paths)}")
+    ordered = [room_dfs[path] for path in paths if path in room_dfs]
+    return combine_rooms(ordered, directory)
@@ -0,0 +1,403 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from data_loader import list_room_files, read_room_file, room_name_from_file, room_sort_key
+from snapshot_store import source_signature
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed with QUERY_BACKEND=duckdb
+    duckdb = None
+    pa = None
+    pq = None
+
+# ------------------ SQL Backend Setup ------------------
+# With QUERY_BACKEND=duckdb the readings are never combined into one in-memory frame.
+# They are kept as Parquet files partitioned by room and date, the LLM writes SQL, and
+# DuckDB runs it with multi-threaded scans that skip every file and row group the
+# query's filters rule out. "pandas" (the default) keeps the in-memory DataFrame path.
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "pandas").lower()
+SQL_BACKEND = QUERY_BACKEND == "duckdb"
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".archive")
+)
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))  # 0 = DuckDB default (one per core)
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "")  # e.g. "4GB"; larger operators spill to disk
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "1000000"))  # rows fetched from one query result
+SQL_COMPACT_PARTS = int(os.getenv("SQL_COMPACT_PARTS", "8"))  # appended files a room/date partition may collect before they are merged
+SQL_BATCH_ROWS = 65536
+READINGS_DIR = "readings"
+STAGING_DIR = ".staging"
+MANIFEST_FILE = "manifest.json"
+# Bump when the partition layout changes so old archives are rebuilt
+ARCHIVE_FORMAT = 2
+MISSING_DATE = "__HIVE_DEFAULT_PARTITION__"  # read back as NULL
+
+archive_stats = {"rooms": 0, "reused": 0, "rebuilt": 0, "appended_files": 0, "compactions": 0, "queries": 0, "truncated": 0}
+
+def _room_dir(root, room):
+    return os.path.join(root, f"room={room}")
+
+def _read_manifest(archive_dir):
+    try:
+        with open(os.path.join(archive_dir, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("format") != ARCHIVE_FORMAT:
+        return {}
+    return manifest.get("files", {})
+
+def _write_manifest(archive_dir, files):
+    tmp_path = os.path.join(archive_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"format": ARCHIVE_FORMAT, "files": files}, f, indent=2)
+    os.replace(tmp_path, os.path.join(archive_dir, MANIFEST_FILE))
+
+def _write_partitions(room_dir, df, part_name):
+    """
+    Writes one room's readings as one file per date under room_dir/date=YYYY-MM-DD/.
+    Rows are sorted by time so each row group's min/max narrows timestamp filters.
+    Returns the date directories written to.
+    """
+    df = df.drop(columns=["room"], errors="ignore").sort_values("timestamp", kind="stable")
+    dates = df["timestamp"].dt.strftime("%Y-%m-%d").fillna(MISSING_DATE)
+    written = []
+    for date, part in df.groupby(dates, sort=False):
+        date_dir = os.path.join(room_dir, f"date={date}")
+        os.makedirs(date_dir, exist_ok=True)
+        # Renamed into place once complete, so queries never open a half-written file
+        path = os.path.join(date_dir, part_name)
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), path + ".pending")
+        os.replace(path + ".pending", path)
+        written.append(date_dir)
+    return written
+
+def _merge_parts(date_dir, parts, merged_name):
+    """
+    Writes the rows of several part files of one partition as a single file, sorted by
+    time. It is written under a name the `readings` glob does not match; returns that path.
+    """
+    tables = [pq.ParquetFile(os.path.join(date_dir, part)).read() for part in parts]
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if "timestamp" in table.column_names:
+        table = table.sort_by("timestamp")
+    pending_path = os.path.join(date_dir, merged_name + ".pending")
+    pq.write_table(table, pending_path)
+    return pending_path
+
+class _ScanLock:
+    """
+    Queries hold it shared; compaction holds it alone just while it swaps files, so no
+    query sees both a partition's old parts and their merged file, or neither.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._swapping = False
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._swapping)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        # New queries wait from here on, so the swap isn't starved by a steady stream of them
+        with self._condition:
+            self._condition.wait_for(lambda: not self._swapping)
+            self._swapping = True
+            self._condition.wait_for(lambda: self._readers == 0)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._swapping = False
+                self._condition.notify_all()
+
+# ------------------ Archive Stats ------------------
+# Row counts, null counts and value ranges are computed in pandas as rows are written
+# (kept per room in the manifest) and merged, so the schema profile in every SQL
+# prompt never has to scan the archive.
+EMPTY_STATS = {"rows": 0, "columns": {}}
+
+def _frame_stats(df) -> dict:
+    """
+    Rows, and per column the null count plus min/max of numeric and time columns.
+    Values are kept JSON-friendly (timestamps as text) for the manifest.
+    """
+    columns = {}
+    for name in df.columns:
+        if name == "room":
+            continue
+        values = df[name]
+        entry = {"nulls": int(values.isna().sum())}
+        if len(values) > entry["nulls"]:
+            if pd.api.types.is_datetime64_any_dtype(values):
+                entry["min"], entry["max"] = str(values.min()), str(values.max())
+            elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                entry["min"], entry["max"] = values.min().item(), values.max().item()
+        columns[name] = entry
+    if "timestamp" in columns:
+        # The date partition key follows the timestamp
+        timestamp = columns["timestamp"]
+        columns["date"] = {"nulls": timestamp["nulls"]}
+        if "min" in timestamp:
+            columns["date"].update(min=timestamp["min"][:10], max=timestamp["max"][:10])
+    return {"rows": len(df), "columns": columns}
+
+def _merge_stats(total: dict, part: dict) -> dict:
+    # A column missing on one side reads back as NULL for all of that side's rows
+    merged = {"rows": total["rows"] + part["rows"], "columns": {}}
+    names = list(total["columns"]) + [name for name in part["columns"] if name not in total["columns"]]
+    for name in names:
+        a = total["columns"].get(name, {"nulls": total["rows"]})
+        b = part["columns"].get(name, {"nulls": part["rows"]})
+        entry = {"nulls": a["nulls"] + b["nulls"]}
+        for key, pick in (("min", min), ("max", max)):
+            values = [value for value in (a.get(key), b.get(key)) if value is not None]
+            if values:
+                try:
+                    entry[key] = pick(values)
+                except TypeError:  # the column changed type between rooms
+                    entry[key] = pick(values, key=str)
+        merged["columns"][name] = entry
+    return merged
+
+# ------------------ Archive Sync ------------------
+def sync_archive(directory="sensor-data", archive_dir=ARCHIVE_DIR, offsets=None):
+    """
+    Brings the partitioned archive in line with the NDJSON room files. A room is rewritten
+    only when its source file's size or mtime changed, one room at a time, so memory use
+    is bounded by the largest room file rather than the whole dataset.
+    If an `offsets` dict is given, it is filled with the byte offset covered per source path.
+    """
+    if offsets is None:
+        offsets = {}
+    readings_dir = os.path.join(archive_dir, READINGS_DIR)
+    staging_dir = os.path.join(archive_dir, STAGING_DIR)
+    os.makedirs(readings_dir, exist_ok=True)
+    manifest = _read_manifest(archive_dir)
+    if not manifest:
+        # Unknown or outdated layout: start from an empty archive
+        shutil.rmtree(readings_dir, ignore_errors=True)
+        os.makedirs(readings_dir, exist_ok=True)
+
+    paths = list_room_files(directory)
+    files = {}
+    rebuilt = 0
+    for path in paths:
+        file = os.path.basename(path)
+        signature = source_signature(path)
+        entry = manifest.get(file)
+        if entry and entry["size"] == signature["size"] and entry["mtime_ns"] == signature["mtime_ns"]:
+            files[file] = entry
+            offsets[path] = entry["size"]
+            continue
+
+        room = room_name_from_file(file)
+        try:
+            df, end_offset = read_room_file(path)
+            # Written to a staging directory outside the scanned tree, then swapped in
+            staged = _room_dir(staging_dir, room)
+            shutil.rmtree(staged, ignore_errors=True)
+            os.makedirs(staged)
+            _write_partitions(staged, df, "part-0.parquet")
+            shutil.rmtree(_room_dir(readings_dir, room), ignore_errors=True)
+            os.replace(staged, _room_dir(readings_dir, room))
+            files[file] = {
+                "room": room, "rows": len(df), "size": end_offset, "mtime_ns": signature["mtime_ns"],
+                "stats": _frame_stats(df)
+            }
+            offsets[path] = end_offset
+            rebuilt += 1
+        except Exception as e:
+            print(f"[⚠️] Failed to archive {file}: {e}")
+
+    # Drop rooms whose source file disappeared
+    live_rooms = {entry["room"] for entry in files.values()}
+    for file, entry in manifest.items():
+        if entry["room"] not in live_rooms:
+            shutil.rmtree(_room_dir(readings_dir, entry["room"]), ignore_errors=True)
+
+    try:
+        _write_manifest(archive_dir, files)
+    except OSError as e:
+        print(f"[⚠️] Failed to write archive manifest: {e}")
+
+    archive_stats.update(rooms=len(files), reused=len(files) - rebuilt, rebuilt=rebuilt)
+    print(f"🗄️ Archive: reused {len(files) - rebuilt} rooms, rebuilt {rebuilt}")
+    return files
+
+# ------------------ SqlArchive ------------------
+class SqlArchive:
+    """
+    The partitioned readings behind a DuckDB connection. This is what the shared dataset
+    holds in SQL mode: generated SQL runs against its `readings` view.
+    """
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, files=None):
+        if duckdb is None:
+            raise RuntimeError("QUERY_BACKEND=duckdb needs the duckdb and pyarrow packages")
+        self.archive_dir = os.path.abspath(archive_dir)
+        self.readings_dir = os.path.join(self.archive_dir, READINGS_DIR)
+        self._write_lock = threading.Lock()
+        self._scan_lock = _ScanLock()
+        self._db = self._connect()
+
+        # Profile inputs, replaced (never mutated) on append so profile() reads them without a lock
+        files = _read_manifest(self.archive_dir) if files is None else files
+        self._stats = EMPTY_STATS
+        for entry in files.values():
+            self._stats = _merge_stats(self._stats, entry.get("stats", EMPTY_STATS))
+        self._rooms = sorted({entry["room"] for entry in files.values() if entry["rows"]}, key=room_sort_key)
+        self._columns, self._sample = [], ""
+        self._refresh_schema()
+
+    def _connect(self):
+        db = duckdb.connect()
+        if DUCKDB_THREADS:
+            db.execute(f"SET threads = {DUCKDB_THREADS}")
+        if DUCKDB_MEMORY_LIMIT:
+            db.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+        pattern = os.path.join(self.readings_dir, "*", "*", "*.parquet")
+        # The glob is expanded per query, so appended files are picked up without a reload
+        db.execute(f"""
+            CREATE VIEW readings AS
+            SELECT * FROM read_parquet('{pattern}', hive_partitioning = true, union_by_name = true,
+                                       hive_types = {{'room': 'VARCHAR', 'date': 'DATE'}})
+        """)
+        # Generated SQL may read the archive and nothing else on disk, and may not undo that
+        db.execute(f"SET allowed_directories = ['{self.readings_dir}{os.sep}']")
+        db.execute("SET enable_external_access = false")
+        db.execute("SET lock_configuration = true")
+        return db
+
+    def query(self, sql: str, max_rows: int = SQL_MAX_ROWS, timeout: float = None):
+        """
+        Runs one SELECT statement and returns (DataFrame, truncated). At most max_rows rows
+        are fetched; the query is interrupted after `timeout` seconds.
+        """
+        statements = duckdb.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("only a single SELECT query is allowed")
+
+        # A cursor per query: its own connection state over the shared database
+        cursor = self._db.cursor()
+        timer = threading.Timer(timeout, cursor.interrupt) if timeout else None
+        try:
+            with self._scan_lock.shared():
+                if timer is not None:
+                    timer.start()
+                reader = cursor.execute(sql).fetch_record_batch(SQL_BATCH_ROWS)
+                batches = []
+                rows = 0
+                for batch in reader:
+                    batches.append(batch)
+                    rows += batch.num_rows
+                    if rows > max_rows:
+                        break
+            table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, max_rows)
+        except duckdb.InterruptException:
+            raise TimeoutError(f"timed out after {timeout:g}s")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            cursor.close()
+
+        archive_stats["queries"] += 1
+        if rows > max_rows:
+            archive_stats["truncated"] += 1
+        return table.to_pandas(), rows > max_rows
+
+    def _refresh_schema(self):
+        # Column types and sample rows come from file metadata and the first row group read,
+        # not a scan; refreshed only when the set of columns changes
+        cursor = self._db.cursor()
+        try:
+            with self._scan_lock.shared():
+                self._columns = [(row[0], row[1]) for row in cursor.execute("DESCRIBE readings").fetchall()]
+                self._sample = cursor.execute("SELECT * FROM readings LIMIT 3").df().to_string(index=False)
+        except duckdb.Error as e:  # no files yet
+            print(f"[⚠️] Could not read the archive schema: {e}")
+        finally:
+            cursor.close()
+
+    def append(self, new_rows):
+        """
+        Adds newly ingested readings as extra files in their room/date partitions. Once a
+        partition holds more than SQL_COMPACT_PARTS files they are merged into one, so
+        the number of files every query opens stays bounded.
+        """
+        part_name = f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet"
+        with self._write_lock:
+            for room, rows in new_rows.groupby("room", observed=True, sort=False):
+                written = _write_partitions(_room_dir(self.readings_dir, room), rows, part_name)
+                archive_stats["appended_files"] += len(written)
+                for date_dir in written:
+                    self._compact(date_dir)
+            self._stats = _merge_stats(self._stats, _frame_stats(new_rows))
+            new_rooms = set(new_rows["room"].unique()) - set(self._rooms)
+            if new_rooms:
+                self._rooms = sorted(set(self._rooms) | new_rooms, key=room_sort_key)
+            if set(self._stats["columns"]) - {name for name, _ in self._columns}:
+                self._refresh_schema()
+
+    def _compact(self, date_dir):
+        parts = sorted(file for file in os.listdir(date_dir) if file.endswith(".parquet"))
+        if len(parts) <= SQL_COMPACT_PARTS:
+            return
+        merged_name = f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}-merged.parquet"
+        try:
+            pending_path = _merge_parts(date_dir, parts, merged_name)
+        except Exception as e:
+            print(f"[⚠️] Failed to compact {date_dir}: {e}")
+            return
+        # The merge ran while queries kept going; only the swap itself waits for them
+        with self._scan_lock.exclusive():
+            os.replace(pending_path, os.path.join(date_dir, merged_name))
+            for part in parts:
+                os.remove(os.path.join(date_dir, part))
+        archive_stats["compactions"] += 1
+
+    def profile(self) -> str:
+        """
+        Schema description of the `readings` view for the SQL prompt: type, range and null
+        share per column, the rooms, and a few sample rows. Built from the stats kept as
+        rows are written, so it costs no query.
+        """
+        stats, rooms, total = self._stats["columns"], self._rooms, self._stats["rows"]
+        lines = [f"Table `readings` ({total} rows, stored as Parquet files partitioned by room and date):"]
+        for name, column_type in self._columns:
+            if name == "room":
+                continue
+            entry = stats.get(name, {"nulls": total})
+            note = " (partition key)" if name == "date" else ""
+            value_range = f", {entry['min']} to {entry['max']}" if "min" in entry else ""
+            nulls = entry["nulls"] / total * 100 if total else 0.0
+            lines.append(f"- {name}: {column_type}{note}{value_range}, {nulls:.1f}% null")
+        lines.append(f"- room: VARCHAR (partition key), {len(rooms)} distinct: {', '.join(rooms)}")
+        return "\n".join(lines) + f"\n\nSample rows:\n{self._sample}\n"
+
+def open_archive(directory="sensor-data", archive_dir=ARCHIVE_DIR, offsets=None) -> SqlArchive:
+    """
+    Syncs the archive with the room files and returns it ready to query.
+    """
+    files = sync_archive(directory, archive_dir, offsets)
+    return SqlArchive(archive_dir, files)
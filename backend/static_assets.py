@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # brotli variants then only come from prebuilt .br files
+    brotli = None
+
+# ------------------ Static Asset Setup ------------------
+# The frontend build is indexed once at startup into an in-memory manifest: each file's
+# bytes, ETag, cache policy and gzip/brotli variants (prebuilt .gz/.br files next to an
+# asset are used as they are). Page loads are then answered without touching the disk,
+# compressed to the client's Accept-Encoding and with 304s for unchanged files.
+STATIC_MANIFEST = os.getenv("STATIC_MANIFEST", "true").lower() == "true"
+STATIC_DIR = os.getenv("STATIC_DIR", "frontend_build")
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))  # seconds, for files without a content hash in the name
+STATIC_GZIP_LEVEL = int(os.getenv("STATIC_GZIP_LEVEL", "9"))
+STATIC_BROTLI_QUALITY = int(os.getenv("STATIC_BROTLI_QUALITY", "11"))
+STATIC_MIN_COMPRESS_BYTES = 1024
+
+INDEX_FILE = "index.html"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.")  # build output like main.1f03510b.js
+COMPRESSIBLE = re.compile(r"^(text/|application/(javascript|json|manifest\+json|xml)|image/svg\+xml)")
+ENCODINGS = [("br", ".br", "-br"), ("gzip", ".gz", "-gz")]  # preference order
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/json", ".map")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+class StaticAsset:
+    __slots__ = ("media_type", "cache_control", "variants", "etags")
+
+    def __init__(self, media_type, cache_control, variants, digest):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.variants = variants  # encoding -> bytes ("identity" always present)
+        self.etags = {"identity": f'"{digest}"'}
+        for encoding, _, suffix in ENCODINGS:
+            if encoding in variants:
+                self.etags[encoding] = f'"{digest}{suffix}"'
+
+def _cache_control(relative_path):
+    if relative_path == INDEX_FILE:
+        # Always revalidated, so a new build is picked up on the next page load
+        return "no-cache"
+    if HASHED_NAME.search(os.path.basename(relative_path)):
+        return IMMUTABLE_CACHE
+    return f"public, max-age={STATIC_MAX_AGE}"
+
+def _compress(encoding, data):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY)
+    return None
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = re.search(r"q=([0-9.]+)", params)
+        if name and (quality is None or float(quality.group(1)) > 0):
+            accepted.add(name.strip().lower())
+    return accepted
+
+def _etag_matches(header: str, asset: StaticAsset) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return any(etag in tags for etag in asset.etags.values())
+
+# ------------------ AssetManifest ------------------
+class AssetManifest:
+    def __init__(self, root=STATIC_DIR):
+        self.root = root
+        self.assets = {}  # path relative to root, with "/" separators -> StaticAsset
+        self.stats = {"files": 0, "bytes": 0, "compressed_bytes": 0, "prebuilt_variants": 0, "not_modified": 0}
+
+    def load(self):
+        """
+        Reads the whole build directory into memory. Call again after a new frontend build.
+        """
+        assets = {}
+        stats = {"files": 0, "bytes": 0, "compressed_bytes": 0, "prebuilt_variants": 0, "not_modified": 0}
+        if not os.path.isdir(self.root):
+            print(f"[⚠️] Frontend build not found at {self.root}")
+        for directory, _, files in os.walk(self.root):
+            names = set(files)
+            for file in files:
+                # Prebuilt variants are attached to their asset rather than served on their own
+                if any(file.endswith(extension) and file[:-len(extension)] in names for _, extension, _ in ENCODINGS):
+                    continue
+                path = os.path.join(directory, file)
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    data = f.read()
+                media_type = mimetypes.guess_type(file)[0] or "application/octet-stream"
+
+                variants = {"identity": data}
+                for encoding, extension, _ in ENCODINGS:
+                    if file + extension in names:
+                        with open(path + extension, "rb") as f:
+                            variants[encoding] = f.read()
+                        stats["prebuilt_variants"] += 1
+                    elif len(data) >= STATIC_MIN_COMPRESS_BYTES and COMPRESSIBLE.match(media_type):
+                        compressed = _compress(encoding, data)
+                        if compressed is not None and len(compressed) < len(data):
+                            variants[encoding] = compressed
+                for encoding, variant in variants.items():
+                    if encoding != "identity":
+                        stats["compressed_bytes"] += len(variant)
+
+                digest = hashlib.sha256(data).hexdigest()[:16]
+                assets[relative] = StaticAsset(media_type, _cache_control(relative), variants, digest)
+                stats["files"] += 1
+                stats["bytes"] += len(data)
+
+        self.assets = assets
+        self.stats = stats
+        print(f"🗂️ Static assets: {stats['files']} files, {stats['bytes'] / 1024:.0f} KB "
+              f"({stats['compressed_bytes'] / 1024:.0f} KB in compressed variants)")
+        return self
+
+    def get(self, relative_path: str):
+        return self.assets.get(relative_path.lstrip("/"))
+
+    def respond(self, asset: StaticAsset, headers) -> Response:
+        """
+        The asset in the best encoding the client accepts, or 304 if its ETag matches.
+        """
+        accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = next(
+            (name for name, _, _ in ENCODINGS if name in accepted and name in asset.variants),
+            "identity"
+        )
+        response_headers = {
+            "ETag": asset.etags[encoding],
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if _etag_matches(headers.get("if-none-match"), asset):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=asset.variants[encoding], media_type=asset.media_type, headers=response_headers)
+
+static_assets = AssetManifest()
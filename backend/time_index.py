@@ -0,0 +1,196 @@
+import os
+import numpy as np
+import pandas as pd
+from data_loader import room_sort_key
+
+# ------------------ Time Index Setup ------------------
+# The combined frame is kept sorted by (room, timestamp) with a categorical `room`,
+# so each room is one contiguous block of rows ordered by time. A small offset table
+# locates every block, and date ranges inside a block are found by binary search.
+TIME_INDEX_ENABLED = os.getenv("TIME_INDEX_ENABLED", "true").lower() == "true"
+
+def _room_categories(*room_columns) -> list:
+    names = set()
+    for rooms in room_columns:
+        if isinstance(rooms.dtype, pd.CategoricalDtype):
+            names.update(rooms.cat.categories)
+        else:
+            names.update(rooms.dropna().unique())
+    return sorted(names, key=lambda name: room_sort_key(str(name)))
+
+def _sort_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # Full stable sort (O(n log n) plus a copy); appends only re-sort the rooms they touch
+    keys = ["room", "timestamp"] if "timestamp" in df.columns else ["room"]
+    return df.sort_values(keys, kind="stable", na_position="last").reset_index(drop=True)
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the frame sorted by (room, timestamp) with `room` as a categorical in natural room order.
+    """
+    if df is None or "room" not in df.columns:
+        return df
+    categories = _room_categories(df["room"])
+    df = df.assign(room=pd.Categorical(df["room"], categories=categories))
+    return _sort_rows(df)
+
+def _merge_block(block: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    # One room's rows plus its new ones, by time (missing timestamps last)
+    if "timestamp" not in block.columns or not len(block):
+        return pd.concat([block, rows], ignore_index=True) if len(block) else rows
+    times, new_times = block["timestamp"], rows["timestamp"]
+    if not times.hasnans and not new_times.hasnans and times.iloc[-1] <= new_times.iloc[0]:
+        # Readings arriving in time order go after the block as they are
+        return pd.concat([block, rows], ignore_index=True)
+    merged = pd.concat([block, rows], ignore_index=True)
+    return merged.sort_values("timestamp", kind="stable", na_position="last")
+
+def _block_bounds(codes: np.ndarray, code: int, named_rows: int):
+    # Rows without a room (code -1) sort after all named rooms
+    if code < 0:
+        return named_rows, len(codes)
+    named = codes[:named_rows]
+    return np.searchsorted(named, code, side="left"), np.searchsorted(named, code, side="right")
+
+def append_frame(df: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merges new rows into a prepared frame, extending the room categories if a new room appears.
+    Only the blocks of rooms that received rows are merged and re-sorted; the rest of the
+    frame is copied through unchanged in a single concat.
+    """
+    categories = _room_categories(df["room"], new_rows["room"])
+    if list(df["room"].cat.categories) != categories:
+        df = df.assign(room=df["room"].cat.set_categories(categories))
+    new_rows = _sort_rows(new_rows.assign(room=pd.Categorical(new_rows["room"], categories=categories)))
+
+    codes = df["room"].cat.codes.to_numpy()
+    new_codes = new_rows["room"].cat.codes.to_numpy()
+    named_rows = int((codes >= 0).sum())
+    pieces = []
+    position = 0
+    for code in sorted(np.unique(new_codes), key=lambda code: (code < 0, code)):
+        start, stop = _block_bounds(codes, code, named_rows)
+        pieces.append(df.iloc[position:start])
+        pieces.append(_merge_block(df.iloc[start:stop], new_rows[new_codes == code]))
+        position = stop
+    pieces.append(df.iloc[position:])
+    return pd.concat([piece for piece in pieces if len(piece)] or [df], ignore_index=True)
+
+# ------------------ Room Offset Table ------------------
+def build_room_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per room: start/stop row positions of its block, the end of its non-missing
+    timestamps (valid_stop), the number of rows and the first/last reading time.
+    """
+    rooms = df["room"]
+    codes = rooms.cat.codes.to_numpy()
+    positions = np.arange(len(rooms.cat.categories))
+    starts = np.searchsorted(codes, positions, side="left")
+    stops = np.searchsorted(codes, positions, side="right")
+
+    if "timestamp" in df.columns:
+        valid = ~np.isnat(df["timestamp"].to_numpy())
+        # Prefix sums, so empty blocks (including a trailing room without rows) count 0
+        cumulative = np.concatenate(([0], np.cumsum(valid)))
+        valid_counts = cumulative[stops] - cumulative[starts]
+    else:
+        valid_counts = stops - starts
+    valid_stops = starts + valid_counts
+
+    index = pd.DataFrame({
+        "room": rooms.cat.categories,
+        "start": starts,
+        "stop": stops,
+        "valid_stop": valid_stops,
+        "rows": stops - starts,
+    })
+    if "timestamp" in df.columns:
+        timestamps = df["timestamp"]
+        has_rows = valid_stops > starts
+        index["first_timestamp"] = pd.NaT
+        index["last_timestamp"] = pd.NaT
+        index.loc[has_rows, "first_timestamp"] = timestamps.iloc[starts[has_rows]].to_numpy()
+        index.loc[has_rows, "last_timestamp"] = timestamps.iloc[valid_stops[has_rows] - 1].to_numpy()
+    return index
+
+def _to_datetime64(value):
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert(None)
+    return value.as_unit("ns").to_datetime64()
+
+def make_row_selector(df: pd.DataFrame, room_index: pd.DataFrame):
+    """
+    Returns select_rows(rooms=None, start=None, end=None) for generated code.
+    """
+    timestamps = df["timestamp"].to_numpy() if "timestamp" in df.columns else None
+    blocks = {row.room: (row.start, row.valid_stop) for row in room_index.itertuples(index=False)}
+
+    def select_rows(rooms=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Rows for the given room name(s) with start <= timestamp < end, found by binary search.
+        Any argument may be None; returns a new DataFrame (safe to modify).
+        """
+        if rooms is None:
+            rooms = list(blocks)
+        elif isinstance(rooms, str):
+            rooms = [rooms]
+
+        lower = _to_datetime64(start) if start is not None else None
+        upper = _to_datetime64(end) if end is not None else None
+
+        ranges = []
+        for room in rooms:
+            if room not in blocks:
+                continue
+            first, last = blocks[room]
+            if timestamps is not None:
+                block = timestamps[first:last]
+                if lower is not None:
+                    first, last = first + np.searchsorted(block, lower, side="left"), last
+                    block = timestamps[first:last]
+                if upper is not None:
+                    last = first + np.searchsorted(block, upper, side="left")
+            if last > first:
+                ranges.append((first, last))
+
+        if not ranges:
+            return df.iloc[0:0].copy()
+        if len(ranges) == 1:
+            return df.iloc[ranges[0][0]:ranges[0][1]].copy()
+        positions = np.concatenate([np.arange(first, last) for first, last in ranges])
+        return df.take(positions).reset_index(drop=True)
+
+    return select_rows
+
+def rows_since(df: pd.DataFrame, rooms, start) -> pd.DataFrame:
+    """
+    Rows of the named rooms from `start` onwards in a prepared frame, located by binary
+    search on the room codes and each room's timestamps rather than a full-frame mask.
+    """
+    codes = df["room"].cat.codes.to_numpy()
+    named_rows = len(codes) if not len(codes) or codes[-1] >= 0 else int((codes >= 0).sum())
+    timestamps = df["timestamp"].to_numpy()
+    lower = _to_datetime64(start)
+
+    wanted = df["room"].cat.categories.get_indexer(pd.Index(rooms).dropna())
+    ranges = []
+    for code in np.unique(wanted[wanted >= 0]):
+        first, last = _block_bounds(codes, code, named_rows)
+        first += np.searchsorted(timestamps[first:last], lower, side="left")
+        if last > first:
+            ranges.append(np.arange(first, last))
+    if not ranges:
+        return df.iloc[0:0]
+    return df.take(np.concatenate(ranges))
+
+def describe_time_index(room_index: pd.DataFrame) -> str:
+    """
+    Prompt text describing the sorted layout and the select_rows helper.
+    """
+    if room_index is None:
+        return ""
+    return f"""
+Fast filtering:
+- `df` is sorted by room, then timestamp. `room` is categorical ({len(room_index)} rooms), so always pass observed=True to groupby on it.
+- `select_rows(rooms=None, start=None, end=None)` returns the rows for one room name or a list of names with start <= timestamp < end (dates or pd.Timestamp; any argument may be None). It uses binary search and returns a copy, so prefer it over boolean filters on `room` or `timestamp`, e.g. select_rows('Room 1', pd.Timestamp('2025-07-10'), pd.Timestamp('2025-07-11')).
+"""
@@ -3,13 +3,21 @@ def get_first_python_code_block(markdown_text: str) -> str:
     Extracts the first Python code block from a markdown-formatted string.
     Returns an empty string if no code block is found.
     """
-    # Find the start of the ```python block
-    start_index = markdown_text.find("```python")
+    return get_first_code_block(markdown_text, "python")
+
+def get_first_code_block(markdown_text: str, language: str) -> str:
+    """
+    Extracts the first code block fenced as ```<language> from a markdown-formatted string.
+    Returns an empty string if no code block is found.
+    """
+    # Find the start of the ```<language> block
+    fence = f"```{language}"
+    start_index = markdown_text.find(fence)
     if start_index == -1:
         return ""
 
-    # Move past the ```python tag
-    start_index += len("```python")
+    # Move past the ```<language> tag
+    start_index += len(fence)
 
     # Find the end of the code block
     end_index = markdown_text.find("```", start_index)
@@ -18,3 +26,18 @@ def get_first_python_code_block(markdown_text: str) -> str:
 
     # Return the code inside the block, stripped of extra whitespace
     return markdown_text[start_index:end_index].strip()
+
+def join_sql_code(sql: str, plot_code: str = "") -> str:
+    """
+    Keeps a generated SQL query and its optional plotting code together as one snippet.
+    """
+    code = f"```sql\n{sql}\n```"
+    if plot_code:
+        code += f"\n\n```python\n{plot_code}\n```"
+    return code
+
+def split_sql_code(code: str):
+    """
+    Inverse of join_sql_code: returns (sql, plot_code).
+    """
+    return get_first_code_block(code, "sql"), get_first_code_block(code, "python")
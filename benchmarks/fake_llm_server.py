@@ -0,0 +1,169 @@
+"""
+Local OpenAI-compatible stand-in for the LLM provider, for offline benchmarks.
+Answers /v1/chat/completions (plain and streamed) after a configurable delay with
+canned replies chosen from the prompt: chart intent, generated code (pandas or SQL)
+or a summary.
+
+    python benchmarks/fake_llm_server.py --port 8100 --latency-ms 300
+    LLM_BASE_URL=http://127.0.0.1:8100/v1 GROQ_API_KEY=fake uvicorn api_server:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+METRICS = ["co2", "temperature", "humidity"]
+VISUAL_WORDS = re.compile(r"\b(plot|chart|graph|visuali[sz]e|trend|show)\b", re.IGNORECASE)
+
+ANALYSIS_CODE = """```python
+table_result = df.groupby('room', observed=True)['{metric}'].agg(['mean', 'min', 'max']).reset_index()
+result = table_result
+```"""
+
+PLOT_CODE = """```python
+data = df.copy()
+data['hour'] = data['timestamp'].dt.hour
+table_result = data.groupby(['hour', 'room'], observed=True)['{metric}'].mean().unstack('room')
+fig, ax = plt.subplots(figsize=(10, 6))
+table_result.plot(ax=ax, marker='o')
+ax.set_title('Average {metric} by hour of day')
+ax.set_xlabel('Hour of day')
+ax.set_ylabel('{metric}')
+result = fig
+```"""
+
+SQL_QUERY = """```sql
+SELECT room, avg({metric}) AS avg_{metric}, min({metric}) AS min_{metric}, max({metric}) AS max_{metric}
+FROM readings
+GROUP BY room
+ORDER BY room
+```"""
+
+SQL_PLOT = """```sql
+SELECT room, hour(timestamp) AS hour, avg({metric}) AS avg_{metric}
+FROM readings
+GROUP BY room, hour
+ORDER BY room, hour
+```
+
+```python
+fig, ax = plt.subplots(figsize=(10, 6))
+df.pivot(index='hour', columns='room', values='avg_{metric}').plot(ax=ax, marker='o')
+ax.set_title('Average {metric} by hour of day')
+ax.set_xlabel('Hour of day')
+ax.set_ylabel('{metric}')
+result = fig
+```"""
+
+SUMMARY = (
+    "Room 1 shows the highest average levels, while the other rooms stay close to each other. "
+    "Readings peak in the late afternoon and drop overnight. "
+    "No unusual gaps appear in the data for the selected period."
+)
+
+config = {"latency_ms": 300.0, "jitter_ms": 50.0, "tokens_per_second": 200.0}
+stats = {"requests": 0, "streamed": 0}
+app = FastAPI()
+
+def _question(prompt: str) -> str:
+    # Code prompts end with: to answer:\n"<question>"
+    match = re.search(r'to answer:\s*"(.*)"\s*$', prompt, re.DOTALL)
+    return match.group(1) if match else prompt
+
+def _metric(text: str) -> str:
+    lowered = text.lower()
+    for metric in METRICS:
+        if metric in lowered or (metric == "temperature" and "temp" in lowered):
+            return metric
+    return "co2"
+
+def canned_reply(messages: list) -> str:
+    system = messages[0]["content"] if messages else ""
+    prompt = messages[-1]["content"] if messages else ""
+    if "data visualization" in system and "numbered queries" in system:
+        lines = re.findall(r"^(\d+)\. (.*)$", prompt, re.MULTILINE)
+        return "\n".join(f"{number}: {'true' if VISUAL_WORDS.search(question) else 'false'}" for number, question in lines)
+    if "data visualization" in system:
+        return "true" if VISUAL_WORDS.search(prompt) else "false"
+    if "DuckDB SQL" in system:
+        template = SQL_PLOT if "matplotlib (as plt) code to answer" in prompt else SQL_QUERY
+        return template.format(metric=_metric(_question(prompt)))
+    if "data-analysis expert" in system:
+        question = _question(prompt)
+        template = PLOT_CODE if "matplotlib (as plt) to answer" in prompt else ANALYSIS_CODE
+        return template.format(metric=_metric(question))
+    return SUMMARY
+
+async def _wait():
+    delay = config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    await asyncio.sleep(max(delay, 0) / 1000)
+
+def _usage(messages, text):
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    completion_tokens = len(text) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "fake")
+    text = canned_reply(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    stats["requests"] += 1
+
+    await _wait()
+    if not body.get("stream"):
+        return JSONResponse({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(messages, text),
+        })
+
+    stats["streamed"] += 1
+    async def chunks():
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        pause = 1 / config["tokens_per_second"] if config["tokens_per_second"] > 0 else 0
+        for token in re.findall(r"\S+\s*", text):
+            if pause:
+                await asyncio.sleep(pause)
+            yield chunk({"content": token})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "benchmarks"}]}
+
+@app.get("/stats")
+async def server_stats():
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300, help="delay before each reply starts")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="pace of streamed replies (0 = no delay)")
+    args = parser.parse_args()
+
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tokens_per_second=args.tokens_per_second)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
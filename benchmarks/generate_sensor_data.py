@@ -0,0 +1,75 @@
+"""
+Generates synthetic room files in the same NDJSON layout as sensor-data/.
+
+    python benchmarks/generate_sensor_data.py --out /tmp/bench-data --rooms 20 --rows 50000
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+# Header layouts seen in the real files, plus a few more the loader has to normalize
+HEADER_VARIANTS = [
+    {"timestamp": "timestamp", "co2": "CO2 (ppm)", "humidity": "Relative Humidity (%)", "temperature": "Temperature (°C)"},
+    {"timestamp": "timestamp", "co2": "co2", "humidity": "rh", "temperature": "temp"},
+    {"timestamp": "timestamp", "co2": "CO2", "humidity": "RH", "temperature": "Temp"},
+    {"timestamp": "log_time", "co2": "co2 level", "humidity": "humidity (%)", "temperature": "temperature"},
+    {"timestamp": "time", "co2": "CO₂", "humidity": "Humidity", "temperature": "T"},
+]
+
+def generate_room(path, rows, variant, start, interval, rng, missing_rate=0.0):
+    """
+    Writes one room file: readings every `interval`, with occasional CO2 spikes and,
+    if missing_rate > 0, readings that leave out one of the sensor fields.
+    """
+    names = HEADER_VARIANTS[variant % len(HEADER_VARIANTS)]
+    base_co2 = rng.uniform(550, 800)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            timestamp = start + i * interval
+            co2 = base_co2 + rng.gauss(0, 120)
+            if rng.random() < 0.01:
+                co2 = rng.uniform(2000, 5000)
+            entry = {
+                names["timestamp"]: timestamp.isoformat(),
+                names["co2"]: round(max(co2, 9), 2),
+                names["humidity"]: round(rng.uniform(30, 60), 2),
+                names["temperature"]: round(rng.uniform(20, 26), 2),
+            }
+            if missing_rate and rng.random() < missing_rate:
+                entry.pop(names[rng.choice(["co2", "humidity", "temperature"])])
+            f.write(json.dumps(entry) + "\n")
+
+def generate(out, rooms, rows, header_variants=len(HEADER_VARIANTS), interval_minutes=15,
+             start="2025-07-03T13:21:58.171539+00:00", missing_rate=0.0, seed=42):
+    """
+    Writes `rooms` files of `rows` readings each into `out`. Returns the file paths.
+    """
+    os.makedirs(out, exist_ok=True)
+    rng = random.Random(seed)
+    start_time = datetime.fromisoformat(start).astimezone(timezone.utc)
+    interval = timedelta(minutes=interval_minutes)
+    paths = []
+    for room in range(1, rooms + 1):
+        path = os.path.join(out, f"sensor_data_Room {room}.ndjson")
+        generate_room(path, rows, (room - 1) % max(header_variants, 1), start_time, interval, rng, missing_rate)
+        paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory to write the room files to")
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1345, help="readings per room")
+    parser.add_argument("--header-variants", type=int, default=len(HEADER_VARIANTS),
+                        help=f"how many header layouts to rotate through (1-{len(HEADER_VARIANTS)})")
+    parser.add_argument("--interval-minutes", type=float, default=15)
+    parser.add_argument("--start", default="2025-07-03T13:21:58.171539+00:00")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="share of readings missing one field")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    paths = generate(args.out, args.rooms, args.rows, args.header_variants, args.interval_minutes,
+                     args.start, args.missing_rate, args.seed)
+    print(f"✅ Wrote {len(paths)} rooms x {args.rows} readings to {args.out}")
@@ -0,0 +1,397 @@
+"""
+End-to-end benchmarks against synthetic data and the local fake LLM server.
+
+Scenarios (latency percentiles and throughput for each):
+  load     - load_combined_df over the generated room files
+  execute  - run_generated_code for canned analysis and plot snippets
+  response - create_response_package (summary LLM call, table, chart)
+  query    - POST /query on a real server process under concurrent load
+  stream   - POST /query/stream, time to the table event and to the last event
+  batch    - POST /query/batch with --batch-size questions, against the same number of /query calls in a row
+
+    python benchmarks/run_benchmarks.py --rooms 20 --rows 20000 --concurrency 16
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+
+QUESTIONS = [
+    "What is the average co2 per room?",
+    "Which room has the highest temperature?",
+    "Show the humidity range for each room",
+    "Plot the co2 trend by hour of day",
+    "Plot the average temperature by hour for every room",
+    "Chart humidity by hour across rooms",
+]
+
+# ------------------ Measuring ------------------
+def summarize(latencies, wall_seconds, errors=0) -> dict:
+    """
+    Latency percentiles (ms) and throughput for one scenario.
+    """
+    values = np.asarray(latencies, dtype="float64") * 1000
+    if not len(values):
+        return {"count": 0, "errors": errors}
+    return {
+        "count": int(len(values)),
+        "errors": errors,
+        "wall_s": round(wall_seconds, 4),
+        "throughput_per_s": round(len(values) / wall_seconds, 3) if wall_seconds else None,
+        "mean_ms": round(float(values.mean()), 3),
+        "min_ms": round(float(values.min()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+def time_calls(func, repeat, *args) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call_start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+# ------------------ Processes ------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for(url, timeout, process=None):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} while waiting for {url}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+def start_fake_llm(port, args):
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_llm_server.py"),
+        "--port", str(port),
+        "--latency-ms", str(args.llm_latency_ms),
+        "--jitter-ms", str(args.llm_jitter_ms),
+        "--tokens-per-second", str(args.llm_tokens_per_second),
+    ])
+    wait_for(f"http://127.0.0.1:{port}/v1/models", 30, process)
+    return process
+
+def stop(process):
+    if process is not None and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+# ------------------ In-Process Scenarios ------------------
+def canned_code(question):
+    from fake_llm_server import canned_reply
+    from utils import get_first_python_code_block
+    from ai_agent.query_understanding import is_visual_query
+    needs_plot = is_visual_query(question)
+    tools = "pandas and matplotlib (as plt)" if needs_plot else "pandas only (no plotting)"
+    reply = canned_reply([
+        {"role": "system", "content": "You are a Python data-analysis expert"},
+        {"role": "user", "content": f'Write Python code using {tools} to answer:\n"{question}"'},
+    ])
+    return get_first_python_code_block(reply), needs_plot
+
+def bench_load(data_dir, repeat):
+    from data_loader import load_combined_df
+    return time_calls(load_combined_df, repeat, data_dir)
+
+def bench_execute(snippets, df, extra_frames, repeat):
+    from ai_agent.code_executor import run_generated_code
+    import matplotlib.pyplot as plt
+
+    def run_all():
+        for code, needs_plot in snippets:
+            result, _ = run_generated_code(code, df, needs_plot, extra_frames)
+            if needs_plot:
+                plt.close(result)
+
+    summary = time_calls(run_all, repeat)
+    summary["snippets_per_call"] = len(snippets)
+    return summary
+
+def bench_response(outcomes, repeat):
+    from ai_agent.response_formatter import create_response_package
+
+    def respond_all():
+        for question, (result, table), needs_plot in outcomes:
+            create_response_package(question, result, needs_plot, table)
+
+    summary = time_calls(respond_all, repeat)
+    summary["responses_per_call"] = len(outcomes)
+    return summary
+
+# ------------------ Server Scenarios ------------------
+async def _load_test(url, requests, concurrency, send):
+    import httpx
+    slots = asyncio.Semaphore(concurrency)
+    latencies, extra, errors = [], [], [0]
+
+    async def one(client, i):
+        async with slots:
+            question = QUESTIONS[i % len(QUESTIONS)] + f" (run {i})"
+            start = time.perf_counter()
+            try:
+                ok, first = await send(client, url, question, start)
+            except httpx.HTTPError:
+                ok, first = False, None
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                extra.append(first)
+            if not ok:
+                errors[0] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        wall = time.perf_counter() - start
+    return latencies, extra, errors[0], wall
+
+async def _send_query(client, url, question, start):
+    response = await client.post(f"{url}/query", json={"query": question})
+    ok = response.status_code == 200 and not response.json()["summary"].startswith("Error")
+    return ok, None
+
+async def _send_stream(client, url, question, start):
+    first_table, ok = None, False
+    async with client.stream("POST", f"{url}/query/stream", json={"query": question}) as response:
+        if response.status_code != 200:
+            return False, None
+        async for line in response.aiter_lines():
+            if line == "event: table" and first_table is None:
+                first_table = time.perf_counter() - start
+            elif line == "event: done":
+                ok = True
+    return ok, first_table
+
+async def _batch_test(url, repeat, size):
+    # Each round sends one batch, then the same number of fresh questions one /query at a time
+    import httpx
+    batch_latencies, serial_latencies, errors = [], [], 0
+    async with httpx.AsyncClient(timeout=600) as client:
+        start_all = time.perf_counter()
+        for round_number in range(repeat):
+            questions = [QUESTIONS[i % len(QUESTIONS)] + f" (batch {round_number}-{i})" for i in range(size)]
+            start = time.perf_counter()
+            response = await client.post(f"{url}/query/batch", json={"queries": questions})
+            batch_latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+            else:
+                errors += sum(item["status"] != "ok" for item in response.json()["results"])
+
+            start = time.perf_counter()
+            for i in range(size):
+                question = QUESTIONS[i % len(QUESTIONS)] + f" (serial {round_number}-{i})"
+                await client.post(f"{url}/query", json={"query": question})
+            serial_latencies.append(time.perf_counter() - start)
+        wall = time.perf_counter() - start_all
+    return batch_latencies, serial_latencies, errors, wall
+
+def bench_server(args, env, data_dir, work_dir):
+    port = free_port()
+    server_env = dict(env, DATA_DIR=data_dir, SNAPSHOT_DIR=os.path.join(work_dir, "snapshot"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=server_env
+    )
+    url = f"http://127.0.0.1:{port}"
+    results = {}
+    try:
+        wait_for(f"{url}/ready", 600, server)
+        if "query" in args.scenarios:
+            latencies, _, errors, wall = asyncio.run(_load_test(url, args.requests, args.concurrency, _send_query))
+            results["query"] = summarize(latencies, wall, errors)
+            results["query"]["concurrency"] = args.concurrency
+        if "stream" in args.scenarios:
+            latencies, first, errors, wall = asyncio.run(_load_test(url, args.requests, args.concurrency, _send_stream))
+            results["stream"] = summarize(latencies, wall, errors)
+            results["stream"]["concurrency"] = args.concurrency
+            results["stream_first_table"] = summarize(first, wall)
+        if "batch" in args.scenarios:
+            batch, serial, errors, wall = asyncio.run(_batch_test(url, args.repeat, args.batch_size))
+            results["batch"] = summarize(batch, wall, errors)
+            results["batch"]["batch_size"] = args.batch_size
+            results["batch_serial"] = summarize(serial, wall)
+    finally:
+        stop(server)
+    return results
+
+# ------------------ Reporting ------------------
+def print_results(results: dict):
+    print(f"{'scenario':<20}{'count':>7}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'per s':>10}{'errors':>8}")
+    for name, entry in results.items():
+        if not entry.get("count"):
+            continue
+        print(
+            f"{name:<20}{entry['count']:>7}{entry['p50_ms']:>12.1f}{entry['p95_ms']:>12.1f}"
+            f"{entry['p99_ms']:>12.1f}{entry['throughput_per_s'] or 0:>10.2f}{entry.get('errors', 0):>8}"
+        )
+
+def compare(before_path, after_path):
+    """
+    Prints the change of p50/p95/p99 and throughput per scenario between two result files.
+    """
+    with open(before_path) as f:
+        before = json.load(f)["scenarios"]
+    with open(after_path) as f:
+        after = json.load(f)["scenarios"]
+
+    def change(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"{'scenario':<20}{'p50':>10}{'p95':>10}{'p99':>10}{'per s':>10}")
+    for name in after:
+        old, new = before.get(name), after[name]
+        if not old or not old.get("count") or not new.get("count"):
+            continue
+        print(
+            f"{name:<20}{change(old['p50_ms'], new['p50_ms']):>10}{change(old['p95_ms'], new['p95_ms']):>10}"
+            f"{change(old['p99_ms'], new['p99_ms']):>10}{change(old['throughput_per_s'] or 0, new['throughput_per_s'] or 0):>10}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="load,execute,response,query,stream,batch",
+                        help="comma-separated subset of: load, execute, response, query, stream, batch")
+    parser.add_argument("--data-dir", help="existing room files to use instead of generating them")
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=5000, help="readings per generated room")
+    parser.add_argument("--repeat", type=int, default=5, help="iterations of the in-process and batch scenarios")
+    parser.add_argument("--requests", type=int, default=60, help="requests per server scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20, help="questions per /query/batch request")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--response-cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    # The in-process scenarios run from backend/, so fix relative paths first
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.data_dir:
+        args.data_dir = os.path.abspath(args.data_dir)
+
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    data_dir = args.data_dir
+    if data_dir is None:
+        from generate_sensor_data import generate
+        data_dir = os.path.join(work_dir, "sensor-data")
+        generate(data_dir, args.rooms, args.rows)
+
+    llm_port = free_port()
+    llm_server = start_fake_llm(llm_port, args)
+    env = dict(
+        os.environ,
+        LLM_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+        GROQ_API_KEY="fake",
+        OPEN_BROWSER="false",
+        CHART_DIR=os.path.join(work_dir, "charts"),
+        SCHEMA_CACHE_PATH=os.path.join(work_dir, "schema_cache.json"),
+        RESPONSE_CACHE_ENABLED="true" if args.response_cache else "false",
+        TOKENIZERS_PARALLELISM="false",
+    )
+
+    results = {}
+    try:
+        in_process = [name for name in ("load", "execute", "response") if name in args.scenarios]
+        if in_process:
+            # Backend modules read their configuration at import time
+            os.environ.update(env)
+            sys.path[:0] = [BACKEND_DIR]
+            os.chdir(BACKEND_DIR)
+
+            if "load" in args.scenarios:
+                results["load"] = bench_load(data_dir, args.repeat)
+            if "execute" in args.scenarios or "response" in args.scenarios:
+                import main as pipeline
+                from data_loader import load_combined_df
+                from dataset import set_dataset, get_state
+                from ai_agent.code_executor import run_generated_code
+                set_dataset(load_combined_df(data_dir))
+                df, _, derived = get_state()
+                extra_frames = pipeline._extra_frames(derived)
+                snippets = [canned_code(question) for question in QUESTIONS]
+                if "execute" in args.scenarios:
+                    results["execute"] = bench_execute(snippets, df, extra_frames, args.repeat)
+                if "response" in args.scenarios:
+                    outcomes = [
+                        (question, run_generated_code(code, df, needs_plot, extra_frames), needs_plot)
+                        for question, (code, needs_plot) in zip(QUESTIONS, snippets)
+                    ]
+                    results["response"] = bench_response(outcomes, args.repeat)
+
+        if "query" in args.scenarios or "stream" in args.scenarios or "batch" in args.scenarios:
+            results.update(bench_server(args, env, data_dir, work_dir))
+    finally:
+        stop(llm_server)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "data_dir": data_dir,
+            "arguments": {key: value for key, value in vars(args).items() if key != "compare"},
+        },
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print_results(results)
+    print(f"📝 Results written to {output}")
+
+if __name__ == "__main__":
+    main()